@@ -0,0 +1,220 @@
+import os
+import sys
+import glob
+import time
+import numpy as np
+import jsoncodec
+from ndjsonsink import latest_json_outputs
+from resultstore import OutputStore
+
+# Amounts may differ by rounding to the rupee on the printed invoice
+DEFAULT_TOLERANCE = 1.0
+
+TOTAL_KEYS = ["Total Amount", "Total Invoice Value", "Invoice Amount"]
+TAX_NAMES = ("CGST", "SGST", "IGST", "Central Tax", "State Tax", "Integrated Tax")
+
+
+# "1,350.00" / "₹ 47,365.00" / "18%" -> float, NaN if not a number
+def parse_amount(value):
+    if isinstance(value, (int, float)):
+        return float(value)
+    cleaned = str(value).replace(",", "").replace("₹", "").replace("%", "").strip()
+    try:
+        return float(cleaned)
+    except ValueError:
+        return np.nan
+
+
+# Pair "<tax> Rate" style keys with their "<tax> Amount" sibling
+def rate_amount_pairs(row):
+    pairs = []
+    for key in row:
+        if not any(name in key for name in TAX_NAMES):
+            continue
+        for suffix in (" Rate (%)", " Rate", " %"):
+            if key.endswith(suffix):
+                amount_key = key[: -len(suffix)] + " Amount"
+                if amount_key in row:
+                    pairs.append((key, amount_key))
+                break
+    return pairs
+
+
+def load_batch(json_paths, stored=None):
+    """Flatten the amounts of a batch of invoice JSON files into arrays.
+
+    stored maps the json paths of outputs that are not files (NDJSON
+    records, documents in the output store) to their data.
+
+    Returns a dict of numpy arrays: per-document totals, per-line-item
+    amounts keyed by document index, and one row per (taxable value, rate,
+    amount) triple found in hsn_summary / tax_summary.
+    """
+    totals, tax_totals, taxable = [], [], []
+    item_doc, item_amount = [], []
+    rate_doc, rate_base, rate_value, rate_amount, rate_field = [], [], [], [], []
+
+    for doc_index, path in enumerate(json_paths):
+        data = stored[path] if stored and path in stored else jsoncodec.load(path)
+
+        totals_section = data.get("totals") or {}
+        total = np.nan
+        if isinstance(totals_section, dict):
+            for key in TOTAL_KEYS:
+                if key in totals_section:
+                    total = parse_amount(totals_section[key])
+                    break
+        totals.append(total)
+
+        for item in data.get("line_items") or []:
+            if isinstance(item, dict) and "Amount" in item:
+                item_doc.append(doc_index)
+                item_amount.append(parse_amount(item["Amount"]))
+
+        # hsn_summary rows carry their own taxable value
+        hsn_taxable = 0.0
+        for i, row in enumerate(data.get("hsn_summary") or []):
+            if not isinstance(row, dict):
+                continue
+            base = parse_amount(row.get("Taxable Value", ""))
+            if not np.isnan(base):
+                hsn_taxable += base
+            for rate_key, amount_key in rate_amount_pairs(row):
+                rate_doc.append(doc_index)
+                rate_base.append(base)
+                rate_value.append(parse_amount(row[rate_key]))
+                rate_amount.append(parse_amount(row[amount_key]))
+                rate_field.append(f"hsn_summary[{i}].{amount_key}")
+
+        # tax_summary rows are checked against the invoice taxable value
+        tax_section = data.get("tax_summary") or {}
+        tax_total = 0.0
+        doc_taxable = np.nan
+        if isinstance(tax_section, dict):
+            doc_taxable = parse_amount(tax_section.get("Taxable Amount", ""))
+            for key, value in tax_section.items():
+                if key.endswith("Amount") and any(name in key for name in TAX_NAMES):
+                    amount = parse_amount(value)
+                    if not np.isnan(amount):
+                        tax_total += amount
+            for rate_key, amount_key in rate_amount_pairs(tax_section):
+                rate_doc.append(doc_index)
+                rate_base.append(np.nan)  # filled in vectorized below
+                rate_value.append(parse_amount(tax_section[rate_key]))
+                rate_amount.append(parse_amount(tax_section[amount_key]))
+                rate_field.append(f"tax_summary.{amount_key}")
+        if np.isnan(doc_taxable) and hsn_taxable:
+            doc_taxable = hsn_taxable
+        tax_totals.append(tax_total)
+        taxable.append(doc_taxable)
+
+    return {
+        "paths": list(json_paths),
+        "total": np.array(totals, dtype=float),
+        "tax_total": np.array(tax_totals, dtype=float),
+        "taxable": np.array(taxable, dtype=float),
+        "item_doc": np.array(item_doc, dtype=np.intp),
+        "item_amount": np.array(item_amount, dtype=float),
+        "rate_doc": np.array(rate_doc, dtype=np.intp),
+        "rate_base": np.array(rate_base, dtype=float),
+        "rate_value": np.array(rate_value, dtype=float),
+        "rate_amount": np.array(rate_amount, dtype=float),
+        "rate_field": rate_field,
+    }
+
+
+def check_batch(batch, tolerance=DEFAULT_TOLERANCE):
+    """Evaluate the arithmetic invariants for a whole batch at once.
+
+    - sum(line_items Amount) equals totals["Total Amount"], either before
+      tax or after adding the tax_summary amounts;
+    - every tax amount equals taxable value x rate / 100.
+
+    Returns a list of failure dicts (file, check, field, expected, actual).
+    """
+    n_docs = len(batch["paths"])
+    failures = []
+
+    # Line items vs. invoice total
+    item_amount = np.nan_to_num(batch["item_amount"])
+    items_sum = np.bincount(batch["item_doc"], weights=item_amount, minlength=n_docs)
+    item_count = np.bincount(batch["item_doc"], minlength=n_docs)
+    total = batch["total"]
+    with_tax = items_sum + batch["tax_total"]
+    checkable = (item_count > 0) & ~np.isnan(total)
+    ok = (np.abs(total - items_sum) <= tolerance) | (
+        np.abs(total - with_tax) <= tolerance
+    )
+    for doc in np.flatnonzero(checkable & ~ok):
+        failures.append(
+            {
+                "file": batch["paths"][doc],
+                "check": "line_items_total",
+                "field": "totals.Total Amount",
+                "expected": round(float(items_sum[doc]), 2),
+                "actual": float(total[doc]),
+            }
+        )
+
+    # Tax amount = taxable value x rate
+    rate_doc = batch["rate_doc"]
+    if rate_doc.size:
+        doc_base = np.where(np.isnan(batch["taxable"]), items_sum, batch["taxable"])
+        base = np.where(
+            np.isnan(batch["rate_base"]), doc_base[rate_doc], batch["rate_base"]
+        )
+        expected = base * batch["rate_value"] / 100.0
+        actual = batch["rate_amount"]
+        checkable = ~np.isnan(expected) & ~np.isnan(actual) & (base > 0)
+        ok = np.abs(expected - actual) <= tolerance
+        for row in np.flatnonzero(checkable & ~ok):
+            failures.append(
+                {
+                    "file": batch["paths"][rate_doc[row]],
+                    "check": "tax_rate",
+                    "field": batch["rate_field"][row],
+                    "expected": round(float(expected[row]), 2),
+                    "actual": float(actual[row]),
+                }
+            )
+
+    return failures
+
+
+def check_invoices(json_paths, tolerance=DEFAULT_TOLERANCE):
+    return check_batch(load_batch(json_paths), tolerance=tolerance)
+
+
+if __name__ == "__main__":
+    # python arithmetic_check.py [json_dir ...]  (default: every *jsonfile dir)
+    # The newest output of each document is checked, whichever backend wrote it
+    start = time.perf_counter()
+    json_paths, stored = [], {}
+    if os.environ.get("INVOICE_OUTPUT_BACKEND") == "sqlite":
+        with OutputStore() as store:
+            stored = dict(store.iter_json(sys.argv[1:] or None))
+        json_paths = list(stored)
+    else:
+        for json_dir in sys.argv[1:] or sorted(glob.glob("*jsonfile")):
+            latest = latest_json_outputs(json_dir)
+            for document in sorted(latest):
+                path, data = latest[document]
+                if path is None:  # an NDJSON record
+                    path = os.path.join(json_dir, f"{document}.json")
+                    stored[path] = data
+                json_paths.append(path)
+
+    batch = load_batch(json_paths, stored)
+    loaded = time.perf_counter()
+    failures = check_batch(batch)
+    checked = time.perf_counter()
+
+    for failure in failures:
+        print(
+            f"{failure['file']} : {failure['check']} {failure['field']} "
+            f"expected {failure['expected']} got {failure['actual']}"
+        )
+    print(
+        f"\nChecked {len(json_paths)} invoices: {len(failures)} inconsistencies "
+        f"(load {loaded - start:.3f}s, check {checked - loaded:.3f}s)"
+    )
@@ -0,0 +1,92 @@
+import os
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+from utils import (
+    extract_pdf_text,
+    save_pdf_text,
+    save_json_output,
+    validate_if_changed,
+)
+
+
+class AsyncInvoiceProcessor:
+    """asyncio front end to the synchronous extract/parse/write/validate steps.
+
+    Meant for services that already run an event loop: nothing here
+    blocks it. Column-box extraction goes to cpu_executor (a process pool
+    by default), parsing and the file reads and writes to threads. At most
+    max_concurrency documents are in flight at a time.
+
+        processor = AsyncInvoiceProcessor(parse_invoice, column_boxes, ...)
+        await processor.process_all(pdf_paths)
+    """
+
+    def __init__(
+        self,
+        parse_invoice,
+        column_boxes_func,
+        output_dir_txt,
+        output_dir_json,
+        validation_output_dir,
+        store=None,
+        cpu_executor=None,
+        max_concurrency=8,
+    ):
+        self.parse_invoice = parse_invoice
+        self.column_boxes_func = column_boxes_func
+        self.output_dir_txt = output_dir_txt
+        self.output_dir_json = output_dir_json
+        self.validation_output_dir = validation_output_dir
+        self.store = store
+        self.own_executor = cpu_executor is None
+        self.cpu_executor = cpu_executor or ProcessPoolExecutor()
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def process(self, pdf_path):
+        """Process one PDF; returns the JSON output path."""
+        loop = asyncio.get_running_loop()
+        base_filename = os.path.splitext(os.path.basename(pdf_path))[0]
+        txt_file_path = os.path.join(self.output_dir_txt, f"{base_filename}.txt")
+        json_file_path = os.path.join(self.output_dir_json, f"{base_filename}.json")
+
+        async with self.semaphore:
+            full_text, offset_map = await loop.run_in_executor(
+                self.cpu_executor, extract_pdf_text, pdf_path, self.column_boxes_func
+            )
+            text = await asyncio.to_thread(
+                save_pdf_text, txt_file_path, full_text, offset_map, self.store
+            )
+            output_data = await asyncio.to_thread(self.parse_invoice, text)
+            await asyncio.to_thread(
+                save_json_output, output_data, json_file_path, self.store
+            )
+            await asyncio.to_thread(
+                validate_if_changed,
+                json_file_path,
+                txt_file_path,
+                self.validation_output_dir,
+                store=self.store,
+            )
+        return json_file_path
+
+    async def process_all(self, pdf_paths):
+        """Process PDFs concurrently; returns {pdf_path: json path or exception}."""
+        pdf_paths = list(pdf_paths)
+        results = await asyncio.gather(
+            *(self.process(pdf_path) for pdf_path in pdf_paths),
+            return_exceptions=True,
+        )
+        for pdf_path, result in zip(pdf_paths, results):
+            if isinstance(result, Exception):
+                print(f"Failed to process {pdf_path}: {result}\n")
+        return dict(zip(pdf_paths, results))
+
+    def close(self):
+        if self.own_executor:
+            self.cpu_executor.shutdown()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await asyncio.to_thread(self.close)
@@ -0,0 +1,158 @@
+import os
+import re
+import sys
+import glob
+import pyarrow as pa
+import pyarrow.dataset as ds
+import jsoncodec
+from arithmetic_check import parse_amount
+from ndjsonsink import latest_json_outputs
+from utils import get_vendor_name
+
+# Tables exported, one dataset each under <out_dir>/<table>/vendor=.../month=...
+# (month as YYYY-MM)
+TABLES = ["line_items", "hsn_summary", "tax_summary"]
+
+# Identifier columns stay strings even when they look numeric (leading zeros)
+IDENTIFIER_KEYS = re.compile(r"HSN|SAC|Code|\bNo\b", re.IGNORECASE)
+
+PARTITIONING = ds.partitioning(
+    pa.schema([("vendor", pa.string()), ("month", pa.string())]), flavor="hive"
+)
+
+
+# invoice_details fields holding the invoice date, most specific first
+DATE_KEYS = ("Invoice Date", "Dated", "date")
+MONTHS = {
+    name: number
+    for number, name in enumerate(
+        "jan feb mar apr may jun jul aug sep oct nov dec".split(), 1
+    )
+}
+
+
+# "13-Jul-2020", "10-Feb-21", "08/12/2020", "07.08.2020" -> "2020-07" etc.
+def parse_year_month(value):
+    match = re.match(
+        r"\s*\d{1,2}[-/. ]([A-Za-z]{3})[A-Za-z]*[-/. ](\d{4}|\d{2})\s*$", value
+    )
+    if match:
+        month = MONTHS.get(match.group(1).lower())
+        year = match.group(2)
+    else:
+        match = re.match(r"\s*\d{1,2}[-/.](\d{1,2})[-/.](\d{4}|\d{2})\s*$", value)
+        if not match:
+            return None
+        month, year = int(match.group(1)), match.group(2)
+    if not month or not 1 <= month <= 12:
+        return None
+    if len(year) == 2:
+        year = "20" + year
+    return f"{year}-{month:02d}"
+
+
+# Year and month of the invoice date, "unknown" when no date field parses;
+# the file name suffix ("_08") has no year, so it is not used
+def get_month(data):
+    details = data.get("invoice_details")
+    if isinstance(details, dict):
+        for key in DATE_KEYS:
+            year_month = parse_year_month(str(details.get(key) or ""))
+            if year_month:
+                return year_month
+    return "unknown"
+
+
+def iter_json_outputs(root="."):
+    """(vendor, document, data) for every document, per-file and NDJSON alike.
+
+    A document written more than once is yielded once, with its newest
+    data (see ndjsonsink.latest_json_outputs).
+    """
+    for json_dir in sorted(glob.glob(os.path.join(root, "*jsonfile"))):
+        vendor = get_vendor_name(json_dir)
+        latest = latest_json_outputs(json_dir)
+        for document in sorted(latest):
+            path, data = latest[document]
+            if path is not None:
+                data = jsoncodec.load(path)  # per-file JSON, read only if newest
+            yield vendor, document, data
+
+
+def flatten_rows(vendor, document, data, table):
+    section = data.get(table)
+    if isinstance(section, dict):
+        section = [section] if any(str(v).strip() for v in section.values()) else []
+    rows = []
+    for i, item in enumerate(section or []):
+        if not isinstance(item, dict):
+            continue
+        row = {
+            "vendor": vendor,
+            "month": get_month(data),
+            "document": document,
+            "row": i,
+        }
+        row.update({key: str(value).strip() for key, value in item.items()})
+        rows.append(row)
+    return rows
+
+
+# Columns whose every non-empty value is a number become float64,
+# everything else (and identifiers) stays a string
+def to_typed_table(rows):
+    columns = {}
+    for row in rows:
+        for key in row:
+            columns.setdefault(key, None)
+
+    arrays = {}
+    for key in columns:
+        values = [row.get(key) for row in rows]
+        if key in ("vendor", "month", "document"):
+            arrays[key] = pa.array(values, type=pa.string())
+        elif key == "row":
+            arrays[key] = pa.array(values, type=pa.int32())
+        elif IDENTIFIER_KEYS.search(key):
+            arrays[key] = pa.array(values, type=pa.string())
+        else:
+            present = [v for v in values if v not in (None, "")]
+            numbers = [parse_amount(v) for v in present]
+            if present and all(n == n for n in numbers):  # no NaN
+                arrays[key] = pa.array(
+                    [parse_amount(v) if v not in (None, "") else None for v in values],
+                    type=pa.float64(),
+                )
+            else:
+                arrays[key] = pa.array(values, type=pa.string())
+    return pa.table(arrays)
+
+
+def export_columnar(out_dir, root=".", file_format="parquet"):
+    rows = {table: [] for table in TABLES}
+    for vendor, document, data in iter_json_outputs(root):
+        for table in TABLES:
+            rows[table].extend(flatten_rows(vendor, document, data, table))
+
+    counts = {}
+    for table in TABLES:
+        if not rows[table]:
+            continue
+        ds.write_dataset(
+            to_typed_table(rows[table]),
+            os.path.join(out_dir, table),
+            format=file_format,
+            partitioning=PARTITIONING,
+            existing_data_behavior="delete_matching",
+        )
+        counts[table] = len(rows[table])
+    return counts
+
+
+if __name__ == "__main__":
+    # python columnar_export.py [out_dir] [parquet|ipc]
+    out_dir = sys.argv[1] if len(sys.argv) > 1 else "columnar"
+    file_format = sys.argv[2] if len(sys.argv) > 2 else "parquet"
+
+    for table, count in export_columnar(out_dir, file_format=file_format).items():
+        print(f"{table}: {count} rows written to {os.path.join(out_dir, table)}")
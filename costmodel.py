@@ -0,0 +1,113 @@
+import os
+import threading
+import jsoncodec
+from ndjsonsink import read_ndjson
+from pdfsource import ArchiveMember, open_pdf
+
+# measured extraction times, one JSON object per document, in the text dir
+COST_LOG = ".extract_costs"
+
+FEATURES = ("pages", "size_mb", "drawings")
+# seconds = intercept + per page + per MB + per first-page drawing, until
+# enough measurements are logged to fit the weights
+DEFAULT_WEIGHTS = (0.05, 0.3, 0.05, 0.0005)
+MIN_SAMPLES = 8
+
+
+# Cheap cost indicators: page count, file size and first-page drawing count
+def document_features(pdf_path):
+    if isinstance(pdf_path, ArchiveMember):
+        size = len(pdf_path.data)
+    else:
+        size = os.path.getsize(pdf_path)
+    with open_pdf(pdf_path) as doc:
+        pages = doc.page_count
+        drawings = len(doc[0].get_drawings()) if pages else 0
+    return {"pages": pages, "size_mb": size / (1024 * 1024), "drawings": drawings}
+
+
+def solve(matrix, vector):
+    """Gaussian elimination with partial pivoting for a small square system."""
+    n = len(vector)
+    rows = [list(matrix[i]) + [vector[i]] for i in range(n)]
+    for col in range(n):
+        pivot = max(range(col, n), key=lambda r: abs(rows[r][col]))
+        rows[col], rows[pivot] = rows[pivot], rows[col]
+        if abs(rows[col][col]) < 1e-12:
+            return None
+        for r in range(col + 1, n):
+            factor = rows[r][col] / rows[col][col]
+            for c in range(col, n + 1):
+                rows[r][c] -= factor * rows[col][c]
+    weights = [0.0] * n
+    for r in range(n - 1, -1, -1):
+        total = rows[r][n] - sum(rows[r][c] * weights[c] for c in range(r + 1, n))
+        weights[r] = total / rows[r][r]
+    return weights
+
+
+class CostModel:
+    """Estimates extraction seconds per document from document_features.
+
+    Weights are refitted by (ridge) least squares over the costs logged in
+    log_dir by earlier runs; record() adds this run's measurements.
+    """
+
+    def __init__(self, log_dir, ridge=1e-3):
+        self.log_path = os.path.join(log_dir, COST_LOG)
+        self.ridge = ridge
+        self.lock = threading.Lock()
+        self.features = {}  # pdf path -> features, for record()
+        self.samples = []
+        if os.path.isfile(self.log_path):
+            self.samples.extend(read_ndjson(self.log_path))
+        self.weights = self.fit()
+
+    def fit(self):
+        if len(self.samples) < MIN_SAMPLES:
+            return DEFAULT_WEIGHTS
+        n = len(FEATURES) + 1
+        xtx = [[0.0] * n for _ in range(n)]
+        xty = [0.0] * n
+        for sample in self.samples:
+            x = [1.0] + [float(sample[name]) for name in FEATURES]
+            for i in range(n):
+                xty[i] += x[i] * sample["seconds"]
+                for j in range(n):
+                    xtx[i][j] += x[i] * x[j]
+        for i in range(1, n):
+            xtx[i][i] += self.ridge
+        return solve(xtx, xty) or DEFAULT_WEIGHTS
+
+    def estimate(self, features):
+        intercept, *weights = self.weights
+        seconds = intercept + sum(
+            w * features[name] for w, name in zip(weights, FEATURES)
+        )
+        return max(seconds, 0.0)
+
+    def order(self, pdf_paths):
+        """All of pdf_paths, most expensive first (longest job first)."""
+        estimates = []
+        for pdf_path in pdf_paths:
+            try:
+                features = document_features(pdf_path)
+            except Exception as e:
+                print(f"Cannot estimate {pdf_path}: {e}")
+                features = None
+            self.features[str(pdf_path)] = features
+            # unreadable documents go first, they fail fast
+            cost = self.estimate(features) if features else float("inf")
+            estimates.append((cost, pdf_path))
+        estimates.sort(key=lambda item: -item[0])
+        return [pdf_path for _, pdf_path in estimates]
+
+    def record(self, pdf_path, seconds):
+        features = self.features.get(str(pdf_path))
+        if not features:
+            return
+        entry = dict(features, name=os.path.basename(pdf_path), seconds=seconds)
+        with self.lock:
+            self.samples.append(entry)
+            with open(self.log_path, "ab") as f:
+                f.write(jsoncodec.dumps(entry, compact=True) + b"\n")
@@ -0,0 +1,116 @@
+from collections import defaultdict
+
+
+class QGramIndex:
+    """q-gram index over one document's text for bounded-distance search.
+
+    The index is built once per document. A value of length m matched with
+    at most k edits shares at least (m - q + 1) - k * q q-grams with the
+    text around its match (q-gram lemma), so only text diagonals that
+    collect that many hits are verified with a banded Levenshtein check.
+    A pattern too short for that bound to be positive with q (e.g. 8
+    characters and 2 edits with q=3) is searched with a shorter q, built
+    on first use.
+    """
+
+    def __init__(self, text, q=3):
+        self.text = text
+        self.q = q
+        self.indexes = {}  # q -> {q-gram: positions}
+        self.grams = self.gram_index(q)
+
+    def gram_index(self, q):
+        grams = self.indexes.get(q)
+        if grams is None:
+            grams = self.indexes[q] = defaultdict(list)
+            for pos in range(len(self.text) - q + 1):
+                grams[self.text[pos : pos + q]].append(pos)
+        return grams
+
+    # Largest q <= self.q whose q-gram lemma bound is still at least 1
+    def gram_length(self, pattern, max_distance):
+        return min(self.q, len(pattern) // (max_distance + 1))
+
+    def candidates(self, pattern, max_distance):
+        """Return candidate start positions, best supported first."""
+        q = self.gram_length(pattern, max_distance)
+        if q < 1:
+            return []  # no more characters than edits: anything would match
+        grams = self.gram_index(q)
+        threshold = (len(pattern) - q + 1) - max_distance * q
+
+        diagonals = []
+        for offset in range(len(pattern) - q + 1):
+            for pos in grams.get(pattern[offset : offset + q], ()):
+                diagonals.append(pos - offset)
+        if len(diagonals) < threshold:
+            return []
+        diagonals.sort()
+
+        # sliding window: hits whose diagonals lie within max_distance
+        found = []
+        lo = 0
+        for hi in range(len(diagonals)):
+            while diagonals[hi] - diagonals[lo] > max_distance:
+                lo += 1
+            hits = hi - lo + 1
+            if hits >= threshold:
+                start = diagonals[lo]
+                if found and start - found[-1][1] <= max_distance:
+                    if hits > found[-1][0]:
+                        found[-1] = (hits, start)
+                else:
+                    found.append((hits, start))
+        found.sort(key=lambda item: -item[0])
+        return [start for _, start in found]
+
+    def find(self, pattern, max_distance=2):
+        """Locate pattern with at most max_distance edits.
+
+        Returns (index, distance), or (-1, None) when nothing is close enough.
+        """
+        exact = self.text.find(pattern)
+        if exact != -1:
+            return exact, 0
+
+        best = (-1, None)
+        for start in self.candidates(pattern, max_distance):
+            window_start = max(0, start - max_distance)
+            window = self.text[window_start : start + len(pattern) + max_distance]
+            match = bounded_levenshtein(pattern, window, max_distance)
+            if match is None:
+                continue
+            distance, offset = match
+            if best[1] is None or distance < best[1]:
+                best = (window_start + offset, distance)
+                if distance == 1:
+                    break
+        return best
+
+
+def bounded_levenshtein(pattern, window, max_distance):
+    """Best match of pattern anywhere inside window (free start and end).
+
+    Returns (distance, start offset in window), or None if every alignment
+    needs more than max_distance edits. Stops early once a whole row
+    exceeds the bound.
+    """
+    # each cell holds (cost, start column of the alignment)
+    prev = [(0, j) for j in range(len(window) + 1)]
+    for i in range(1, len(pattern) + 1):
+        ch = pattern[i - 1]
+        cur = [(i, 0)]
+        for j in range(1, len(window) + 1):
+            diag = prev[j - 1]
+            sub = (diag[0] + (ch != window[j - 1]), diag[1])
+            up = (prev[j][0] + 1, prev[j][1])
+            left = (cur[j - 1][0] + 1, cur[j - 1][1])
+            cur.append(min(sub, up, left))
+        if min(cost for cost, _ in cur) > max_distance:
+            return None
+        prev = cur
+
+    distance, start = min(prev[1:], default=prev[0])
+    if distance > max_distance:
+        return None
+    return distance, start
@@ -0,0 +1,47 @@
+import os
+import sys
+import socket
+import jsoncodec
+
+# Client of invoicedaemon.py; imports neither fitz nor the vendor scripts, so
+# a job costs the interpreter start-up plus the daemon's processing time.
+#   python invoiceclient.py submit vendor pdf...  e.g. submit Vaco allinvoices/vaco_08.pdf
+#   python invoiceclient.py stop
+# Each connection carries one JSON line, {"vendor": "Vaco", "pdf": "/abs/path.pdf"}
+# or {"command": "stop"}, and gets one JSON line back.
+SOCKET_PATH = os.environ.get("INVOICE_DAEMON_SOCKET", ".invoicedaemon.sock")
+
+
+# One request/response round trip to a running daemon
+def send(request, socket_path=SOCKET_PATH):
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(socket_path)
+        sock.sendall(jsoncodec.dumps(request, compact=True) + b"\n")
+        with sock.makefile("rb") as f:
+            return jsoncodec.loads(f.readline())
+
+
+# Process one PDF; the daemon resolves relative paths against its own cwd
+def submit(vendor, pdf_path, socket_path=SOCKET_PATH):
+    return send({"vendor": vendor, "pdf": os.path.abspath(pdf_path)}, socket_path)
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else ""
+
+    if command == "submit" and len(sys.argv) > 3:
+        failed = 0
+        for pdf_path in sys.argv[3:]:
+            response = submit(sys.argv[2], pdf_path)
+            if response["ok"]:
+                print(f"{pdf_path}: {response['json']} ({response['seconds']}s)")
+            else:
+                failed += 1
+                print(f"{pdf_path}: failed, {response['error']}")
+        sys.exit(1 if failed else 0)
+
+    elif command == "stop":
+        send({"command": "stop"})
+
+    else:
+        sys.exit("usage: invoiceclient.py submit vendor pdf... | stop")
@@ -0,0 +1,180 @@
+import os
+import sys
+import glob
+import time
+import signal
+import importlib
+import threading
+import socketserver
+import fitz  # PyMuPDF, imported once here and inherited by the workers
+import jsoncodec
+from invoiceclient import SOCKET_PATH
+from journal import flush_outputs
+from resultstore import open_output_store
+from timebudget import RecyclingPool
+from utils import (
+    extract_pdf_text,
+    get_vendor_name,
+    save_pdf_text,
+    save_json_output,
+    validate_if_changed,
+)
+
+# Long-lived worker for single invoices: start it once, then each job skips
+# the interpreter start-up, `import fitz` and the vendor module imports.
+#   python invoicedaemon.py [workers]     serves on SOCKET_PATH in the foreground
+# Jobs are sent with invoiceclient.py. Output directories are relative to the
+# daemon's cwd. The outputs of a job are flushed before its reply, and SIGTERM
+# stops the daemon like the "stop" command.
+
+VENDOR_SCRIPTS = ("multicolcombin*.py", "multicolCombine*.py")
+
+
+# Vendor name (as in the output dirs, e.g. "Vaco") -> imported vendor script
+def load_vendor_modules(root="."):
+    modules = {}
+    for pattern in VENDOR_SCRIPTS:
+        for path in sorted(glob.glob(os.path.join(root, pattern))):
+            name = os.path.splitext(os.path.basename(path))[0]
+            try:
+                module = importlib.import_module(name)
+            except Exception as e:
+                print(f"Cannot load {name}: {e}")
+                continue
+            if hasattr(module, "parse_invoice"):
+                modules[get_vendor_name(module.output_dir_json)] = module
+    return modules
+
+
+# Vendor scripts by name, loaded by the daemon and each pool worker
+vendor_modules = {}
+
+
+# Pool initializer; a forked worker inherits the loaded modules, a spawned one
+# loads them here so its first document does not pay for the imports
+def warm_worker():
+    if not vendor_modules:
+        vendor_modules.update(load_vendor_modules())
+
+
+# Extraction in a worker process; the vendor is looked up by name there
+def extract_for_vendor(vendor, pdf_path):
+    module = vendor_modules[vendor]
+    return extract_pdf_text(pdf_path, module.column_boxes)
+
+
+def get_vendor_module(vendor):
+    module = vendor_modules.get(vendor)
+    if module is None:
+        raise ValueError(f"unknown vendor {vendor!r}")
+    return module
+
+
+# Everything after extraction, on the calling thread: write the text, parse,
+# write the JSON and validate, the same steps as pipeline.process_invoices.
+# "records" is None when the outputs were unchanged and not validated again.
+def finish_job(module, name, full_text, offset_map, store=None):
+    base_filename = os.path.splitext(os.path.basename(name))[0]
+    txt_file_path = os.path.join(module.output_dir_txt, f"{base_filename}.txt")
+    json_file_path = os.path.join(module.output_dir_json, f"{base_filename}.json")
+
+    text = save_pdf_text(txt_file_path, full_text, offset_map, store)
+    output_data = module.parse_invoice(text)
+    save_json_output(output_data, json_file_path, store=store)
+    records = validate_if_changed(
+        json_file_path, txt_file_path, module.validation_output_dir, store=store
+    )
+    return {
+        "text": txt_file_path,
+        "json": json_file_path,
+        "output_data": output_data,
+        "document_text": text,
+        "offset_map": offset_map,
+        "records": records,
+    }
+
+
+# SIGTERM (systemd, docker stop) shuts the server down from another thread, as
+# shutdown() waits for serve_forever on the main thread; the caller's finally
+# block then closes it
+def stop_on_sigterm(server):
+    def stop(signum, frame):
+        threading.Thread(target=server.shutdown).start()
+
+    signal.signal(signal.SIGTERM, stop)
+
+
+class InvoiceDaemon(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Unix socket server running invoice jobs on a warm process pool.
+
+    Column-box extraction goes to the pool; writing, parsing and validation
+    run on the connection's thread against one shared output store, like the
+    thread stages of pipeline.process_invoices. Each job's outputs are
+    flushed to disk before it is answered; close() waits for the jobs in
+    progress before it closes the store.
+    """
+
+    daemon_threads = False  # so server_close() joins the job threads
+
+    def __init__(self, socket_path=SOCKET_PATH, workers=None, store=None):
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)  # left behind by a daemon that was killed
+        super().__init__(socket_path, JobHandler)
+        os.chmod(socket_path, 0o600)
+        self.socket_path = socket_path
+        self.store = store if store is not None else open_output_store()
+        # INVOICE_RECYCLE_DOCS / INVOICE_RECYCLE_RSS_MB replace the workers
+        self.pool = RecyclingPool(workers, initializer=warm_worker)
+
+    def process(self, vendor, pdf_path):
+        module = get_vendor_module(vendor)
+        full_text, offset_map = self.pool.submit(
+            extract_for_vendor, vendor, pdf_path
+        ).result()
+        job = finish_job(module, pdf_path, full_text, offset_map, self.store)
+        flush_outputs(self.store)
+        return {"text": job["text"], "json": job["json"]}
+
+    def close(self):
+        self.server_close()
+        self.pool.shutdown()
+        self.store.close()
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+
+
+class JobHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        line = self.rfile.readline()
+        start = time.perf_counter()
+        try:
+            request = jsoncodec.loads(line)
+            if request.get("command") == "stop":
+                # shutdown() waits for serve_forever, so not from this thread
+                threading.Thread(target=self.server.shutdown).start()
+                response = {"ok": True}
+            else:
+                response = self.server.process(request["vendor"], request["pdf"])
+                response["ok"] = True
+        except Exception as e:
+            print(f"Failed job {line!r}: {e}\n")
+            response = {"ok": False, "error": str(e)}
+        response["seconds"] = round(time.perf_counter() - start, 4)
+        self.wfile.write(jsoncodec.dumps(response, compact=True) + b"\n")
+
+
+if __name__ == "__main__":
+    workers = int(sys.argv[1]) if len(sys.argv) > 1 else None
+    vendor_modules.update(load_vendor_modules())
+    server = InvoiceDaemon(workers=workers)
+    stop_on_sigterm(server)
+    print(
+        f"Serving {', '.join(sorted(vendor_modules))} on {server.socket_path}"
+        f" (PyMuPDF {fitz.VersionBind})"
+    )
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
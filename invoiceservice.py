@@ -0,0 +1,289 @@
+import os
+import sys
+import time
+import queue
+import threading
+from contextlib import contextmanager
+from functools import partial
+from urllib.parse import parse_qs, urlsplit
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from concurrent.futures import Future, as_completed
+import jsoncodec
+from invoicedaemon import (
+    extract_for_vendor,
+    finish_job,
+    get_vendor_module,
+    load_vendor_modules,
+    stop_on_sigterm,
+    vendor_modules,
+    warm_worker,
+)
+from journal import flush_outputs
+from resultstore import open_output_store
+from timebudget import RecyclingPool
+from utils import check_values_in_text
+
+# Local HTTP front end to the invoice pipeline, for callers that would
+# otherwise start a vendor script per invoice.
+#   python invoiceservice.py [port] [workers]     listens on 127.0.0.1:8765
+#
+#   POST /invoices/<vendor>?name=<file.pdf>   body: the PDF (application/pdf)
+#       -> one JSON result
+#   POST /invoices/<vendor>   body: {"pdfs": ["/abs/a.pdf", ...]} (application/json)
+#       -> NDJSON, one result line per PDF in the order they finish
+#   GET /health
+# A result is {"document", "ok", "data", "validation": {"checked", "not_found"},
+# "json", "seconds"}, or {"document", "ok": false, "error"}. A result is sent
+# once its outputs are flushed; SIGTERM stops the service after the requests
+# in progress.
+DEFAULT_PORT = 8765
+MAX_BODY = 64 * 1024 * 1024
+
+# Requests arriving within BATCH_WAIT seconds of each other share pool tasks
+BATCH_WAIT = 0.005
+BATCH_SIZE = 32
+
+
+# A batch of extractions in one worker process; errors are returned per item so
+# one bad PDF does not fail the others
+def extract_batch(items):
+    results = []
+    for vendor, source in items:
+        try:
+            results.append((extract_for_vendor(vendor, source), None))
+        except Exception as e:
+            results.append((None, f"{type(e).__name__}: {e}"))
+    return results
+
+
+def resolve_batch(futures, task):
+    try:
+        results = task.result()
+    except Exception as e:  # e.g. a worker that died
+        for future in futures:
+            future.set_exception(e)
+        return
+    for future, (result, error) in zip(futures, results):
+        if error is None:
+            future.set_result(result)
+        else:
+            future.set_exception(RuntimeError(error))
+
+
+class MicroBatcher:
+    """Groups extraction requests that arrive together into few pool tasks.
+
+    A batch is closed BATCH_WAIT seconds after its first request or at
+    BATCH_SIZE requests, then spread over the workers, one task each, so
+    the per-task pickling and IPC is paid per batch rather than per PDF.
+    submit() returns a Future for the (full_text, offset_map) of one PDF.
+    """
+
+    def __init__(self, pool, workers, max_wait=BATCH_WAIT, max_batch=BATCH_SIZE):
+        self.pool = pool
+        self.workers = workers
+        self.max_wait = max_wait
+        self.max_batch = max_batch
+        self.requests = queue.Queue()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def submit(self, vendor, source):
+        future = Future()
+        self.requests.put((vendor, source, future))
+        return future
+
+    def run(self):
+        while True:
+            request = self.requests.get()
+            if request is None:
+                break
+            batch = [request]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch:
+                try:
+                    request = self.requests.get(
+                        timeout=max(0, deadline - time.monotonic())
+                    )
+                except queue.Empty:
+                    break
+                if request is None:
+                    self.requests.put(None)  # end after this batch
+                    break
+                batch.append(request)
+            self.dispatch(batch)
+
+    def dispatch(self, batch):
+        for i in range(min(self.workers, len(batch))):
+            chunk = batch[i :: self.workers]
+            task = self.pool.submit(
+                extract_batch, [(v, s) for v, s, _ in chunk], documents=len(chunk)
+            )
+            task.add_done_callback(partial(resolve_batch, [f for _, _, f in chunk]))
+
+    def close(self):
+        self.requests.put(None)
+        self.thread.join()
+
+
+class InvoiceService(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, workers=None, store=None):
+        super().__init__(address, InvoiceRequestHandler)
+        self.workers = workers or os.cpu_count() or 1
+        self.store = store if store is not None else open_output_store()
+        self.pool = RecyclingPool(self.workers, initializer=warm_worker)
+        self.batcher = MicroBatcher(self.pool, self.workers)
+        self.active = 0  # requests being processed
+        self.closing = False
+        self.idle = threading.Condition()
+
+    # Wraps the processing of a request, so close() can wait for it (idle
+    # keep-alive connections are not waited for); yields False once closing
+    @contextmanager
+    def request_in_progress(self):
+        with self.idle:
+            accepted = not self.closing
+            if accepted:
+                self.active += 1
+        if not accepted:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            with self.idle:
+                self.active -= 1
+                self.idle.notify_all()
+
+    # Result of one extraction future: outputs written, JSON and validation summary
+    def finish(self, vendor, pdf_path, future, start):
+        name = os.path.basename(pdf_path)
+        try:
+            full_text, offset_map = future.result()
+            job = finish_job(
+                get_vendor_module(vendor), name, full_text, offset_map, self.store
+            )
+        except Exception as e:
+            print(f"Failed to process {name}: {e}\n")
+            return {"document": name, "ok": False, "error": str(e)}
+        flush_outputs(self.store)
+        records = job["records"]
+        if records is None:  # unchanged since its last validation, which was skipped
+            _, records = check_values_in_text(
+                job["output_data"], job["document_text"], job["offset_map"]
+            )
+        return {
+            "document": name,
+            "ok": True,
+            "data": job["output_data"],
+            "validation": {
+                "checked": len(records),
+                "not_found": [key for key, _, idx, _, _ in records if idx == -1],
+            },
+            "json": job["json"],
+            "seconds": round(time.perf_counter() - start, 4),
+        }
+
+    def close(self):
+        self.server_close()
+        with self.idle:
+            self.closing = True
+            self.idle.wait_for(lambda: not self.active)
+        self.batcher.close()
+        self.pool.shutdown()
+        self.store.close()
+
+
+class InvoiceRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # chunked responses for the NDJSON results
+
+    def send_json(self, status, body):
+        data = jsoncodec.dumps(body, compact=True)
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def send_chunk(self, data):
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+        self.wfile.flush()
+
+    def do_GET(self):
+        if urlsplit(self.path).path != "/health":
+            self.send_json(404, {"error": "not found"})
+            return
+        self.send_json(200, {"ok": True, "vendors": sorted(vendor_modules)})
+
+    def do_POST(self):
+        with self.server.request_in_progress() as accepted:
+            if not accepted:
+                self.send_json(503, {"error": "shutting down"})
+                self.close_connection = True  # the body was not read
+                return
+            self.handle_post()
+
+    def handle_post(self):
+        start = time.perf_counter()
+        url = urlsplit(self.path)
+        parts = url.path.strip("/").split("/")
+        if len(parts) != 2 or parts[0] != "invoices":
+            self.send_json(404, {"error": "not found"})
+            self.close_connection = True  # the body was not read
+            return
+        length = int(self.headers.get("Content-Length") or 0)
+        if length > MAX_BODY:
+            self.send_json(413, {"error": f"body over {MAX_BODY} bytes"})
+            self.close_connection = True
+            return
+        body = self.rfile.read(length)
+        vendor = parts[1]
+        if vendor not in vendor_modules:
+            self.send_json(404, {"error": f"unknown vendor {vendor!r}"})
+            return
+        server = self.server
+
+        if self.headers.get_content_type() == "application/json":
+            try:
+                pdf_paths = jsoncodec.loads(body)["pdfs"]
+            except (ValueError, KeyError, TypeError):
+                self.send_json(400, {"error": 'expected {"pdfs": [...]}'})
+                return
+            futures = {
+                server.batcher.submit(vendor, pdf_path): pdf_path
+                for pdf_path in pdf_paths
+            }
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            for future in as_completed(futures):
+                result = server.finish(vendor, futures[future], future, start)
+                self.send_chunk(jsoncodec.dumps(result, compact=True) + b"\n")
+            self.wfile.write(b"0\r\n\r\n")
+            return
+
+        name = parse_qs(url.query).get("name", [""])[0]
+        if not name:
+            self.send_json(400, {"error": "name=<file.pdf> is required"})
+            return
+        future = server.batcher.submit(vendor, body)
+        result = server.finish(vendor, name, future, start)
+        self.send_json(200 if result["ok"] else 422, result)
+
+
+if __name__ == "__main__":
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_PORT
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else None
+    vendor_modules.update(load_vendor_modules())
+    server = InvoiceService(("127.0.0.1", port), workers)
+    stop_on_sigterm(server)
+    print(f"Serving {', '.join(sorted(vendor_modules))} on http://127.0.0.1:{port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
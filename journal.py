@@ -0,0 +1,136 @@
+import os
+import sys
+import time
+import threading
+import jsoncodec
+from ndjsonsink import read_ndjson
+from pdfsource import ArchiveMember
+from utils import file_hash, find_text_output, output_hash
+
+# Progress of a batch run, one JSON line per completed document, in the JSON
+# output dir; --resume (or INVOICE_RESUME=1) skips what it lists
+JOURNAL = ".run_journal"
+
+
+def get_resume(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    return "--resume" in argv or os.environ.get("INVOICE_RESUME", "") not in ("", "0")
+
+
+# (size, mtime) of an input, so an invoice replaced since is done again
+def source_signature(pdf_path):
+    if isinstance(pdf_path, ArchiveMember):
+        stat = os.stat(pdf_path.archive_path)
+        return [len(pdf_path.data), stat.st_mtime_ns]
+    stat = os.stat(pdf_path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+# Make everything the store still buffers durable: queued file writes, the
+# run's NDJSON file and SQLite rows
+def flush_outputs(store):
+    if store is None:
+        return
+    if store.writer is not None:
+        store.writer.flush()
+    if store.json_sink is not None:
+        store.json_sink.flush()
+    store.flush()
+
+
+class RunJournal:
+    """Append-only journal of the documents a run has completed.
+
+    A document is recorded after its last stage, and the journal lines are
+    only written (and fsynced) after flush_outputs, so a journaled
+    document never has outputs still in a buffer. A crash loses at most
+    the last flush_every entries or flush_interval seconds of them, and
+    those documents are simply done again. For outputs kept as files the
+    journal has their hashes and is_done() checks them, so an output lost
+    or truncated afterwards (e.g. by a reboot before the page cache was
+    written) does not count as done.
+    """
+
+    def __init__(
+        self, output_dir, resume=False, store=None, flush_every=20, flush_interval=5.0
+    ):
+        self.path = os.path.join(output_dir, JOURNAL)
+        self.store = store
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        self.last_flush = time.monotonic()
+        self.done = {}  # source -> entry
+        self.pending = []
+        self.lock = threading.RLock()
+        if resume and os.path.isfile(self.path):
+            for entry in read_ndjson(self.path):
+                self.done[entry["source"]] = entry
+            self.file = open(self.path, "ab")
+        else:
+            self.file = open(self.path, "wb")  # a new run starts a new journal
+
+    def is_done(self, pdf_path):
+        entry = self.done.get(str(pdf_path))
+        if entry is None:
+            return False
+        try:
+            if entry["input"] != source_signature(pdf_path):
+                return False
+        except OSError:
+            return False
+        # outputs kept as files must still be there as they were written
+        for path_key, hash_key in (("txt_file", "txt_hash"), ("json", "json_hash")):
+            if hash_key not in entry:
+                continue
+            try:
+                if file_hash(entry[path_key]) != entry[hash_key]:
+                    return False
+            except OSError:
+                return False
+        return True
+
+    # pdf paths that still have to be processed
+    def remaining(self, pdf_paths):
+        for pdf_path in pdf_paths:
+            if self.is_done(pdf_path):
+                print(f"Already done: {pdf_path}")
+                continue
+            yield pdf_path
+
+    def record(self, job):
+        entry = {
+            "source": str(job["pdf_path"]),
+            "input": source_signature(job["pdf_path"]),
+            "txt": job["txt_file_path"],
+            "json": job["json_file_path"],
+        }
+        store = self.store
+        if store is None or not store.replaces_files:
+            txt_file = find_text_output(job["txt_file_path"], store)
+            entry["txt_file"] = txt_file
+            entry["txt_hash"] = output_hash(txt_file, store)
+            if store is None or store.json_sink is None:
+                entry["json_hash"] = output_hash(job["json_file_path"], store)
+        with self.lock:
+            self.pending.append(entry)
+            if (
+                len(self.pending) >= self.flush_every
+                or time.monotonic() - self.last_flush >= self.flush_interval
+            ):
+                self.flush()
+
+    def flush(self):
+        with self.lock:
+            if not self.pending:
+                return
+            flush_outputs(self.store)
+            for entry in self.pending:
+                self.file.write(jsoncodec.dumps(entry, compact=True) + b"\n")
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            self.pending = []
+            self.last_flush = time.monotonic()
+
+    def close(self):
+        self.flush()
+        self.file.close()
@@ -0,0 +1,39 @@
+import os
+import json
+
+# orjson when available, the stdlib otherwise; both give the same bytes
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# "indent" (default) keeps the JSON outputs readable for review,
+# "compact" drops the whitespace for machine consumers
+JSON_FORMAT = os.environ.get("INVOICE_JSON_FORMAT", "indent")
+
+
+def dumps(obj, compact=None):
+    """Serialize obj to UTF-8 bytes, indented by 2 or compact.
+
+    compact=None follows INVOICE_JSON_FORMAT.
+    """
+    if compact is None:
+        compact = JSON_FORMAT == "compact"
+    if orjson is not None:
+        return orjson.dumps(obj, option=0 if compact else orjson.OPT_INDENT_2)
+    if compact:
+        text = json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+    else:
+        text = json.dumps(obj, ensure_ascii=False, indent=2)
+    return text.encode("utf-8")
+
+
+def loads(data):
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def load(path):
+    with open(path, "rb") as f:
+        return loads(f.read())
@@ -0,0 +1,140 @@
+import os
+import sys
+import shutil
+import sqlite3
+import jsoncodec
+from costmodel import COST_LOG
+from journal import JOURNAL
+from ndjsonsink import read_ndjson
+from resultstore import DEFAULT_DB_PATH, DOCUMENT_SCHEMA, SCHEMA
+from utils import ALIAS_MANIFEST, VALIDATION_MANIFEST, file_hash
+
+# Combine the outputs of a run split with --shard i/N over several machines.
+#   python mergeshards.py out_dir shard_dir...   e.g. mergeshards.py merged node0 node1
+# Each shard_dir is the working directory of one machine (its *txtfile,
+# *jsonfile, *validatejsontext folders and validation_results.db); out_dir
+# gets the same layout. Shards are taken in the order given.
+
+# folders holding a vendor's outputs, "Vacojsonfile" etc.
+OUTPUT_SUFFIXES = ("txtfile", "textfile", "jsonfile", "validatejsontext")
+
+VALIDATION_COLUMNS = (
+    "vendor, document, field_path, full_key, value, text_index, distance,"
+    " page, status, validated_at"
+)
+
+
+def is_output_dir(name):
+    return any(name.endswith(suffix) and name != suffix for suffix in OUTPUT_SUFFIXES)
+
+
+# Manifests and run NDJSON files are append-only line files, merged by
+# concatenation; every other file, e.g. a binary .zstd-dict-<id>, is copied
+LINE_FILES = (VALIDATION_MANIFEST, ALIAS_MANIFEST, JOURNAL, COST_LOG)
+
+
+def is_line_file(name):
+    return name in LINE_FILES or name.endswith(".ndjson")
+
+
+def append_lines(src, dst):
+    appended = 0
+    with open(dst, "ab") as f_out:
+        for record in read_ndjson(src):
+            f_out.write(jsoncodec.dumps(record, compact=True) + b"\n")
+            appended += 1
+    return appended
+
+
+def merge_output_dir(src_dir, dst_dir, counts):
+    """Copy one shard's output folder into dst_dir.
+
+    A document is on one shard only, so a name already in dst_dir with
+    other content means two different inputs had the same file name; the
+    first shard's file is kept and the clash reported.
+    """
+    os.makedirs(dst_dir, exist_ok=True)
+    for entry in sorted(os.scandir(src_dir), key=lambda entry: entry.name):
+        if not entry.is_file():
+            continue
+        dst = os.path.join(dst_dir, entry.name)
+        if is_line_file(entry.name):
+            counts["lines"] += append_lines(entry.path, dst)
+        elif not os.path.exists(dst):
+            shutil.copy2(entry.path, dst)
+            counts["files"] += 1
+        elif file_hash(dst) != file_hash(entry.path):
+            print(f"Name clash, kept the first shard's file: {dst} ({entry.path})")
+            counts["clashes"] += 1
+
+
+# Validation rows under new run ids, and stored documents (sqlite backend)
+def merge_database(src_path, conn, counts):
+    conn.execute("ATTACH DATABASE ? AS shard", (src_path,))
+    try:
+        runs = conn.execute("SELECT id, started_at FROM shard.runs ORDER BY id")
+        for run_id, started_at in runs.fetchall():
+            cur = conn.execute(
+                "INSERT INTO runs (started_at) VALUES (?)", (started_at,)
+            )
+            cur = conn.execute(
+                f"INSERT INTO validation_results (run_id, {VALIDATION_COLUMNS})"
+                f" SELECT ?, {VALIDATION_COLUMNS} FROM shard.validation_results"
+                " WHERE run_id = ?",
+                (cur.lastrowid, run_id),
+            )
+            counts["validation rows"] += cur.rowcount
+        has_documents = conn.execute(
+            "SELECT 1 FROM shard.sqlite_master WHERE name = 'documents'"
+        ).fetchone()
+        if has_documents:
+            conn.executescript(DOCUMENT_SCHEMA)
+            cur = conn.execute(
+                "INSERT OR IGNORE INTO documents SELECT * FROM shard.documents"
+            )
+            counts["documents"] += cur.rowcount
+        conn.commit()
+    finally:
+        conn.execute("DETACH DATABASE shard")
+
+
+def merge_shards(out_dir, shard_dirs, db_name=DEFAULT_DB_PATH):
+    out_db = os.path.join(out_dir, db_name)
+    if os.path.exists(out_db):
+        raise FileExistsError(f"{out_db} exists; merge into an empty directory")
+    os.makedirs(out_dir, exist_ok=True)
+    counts = dict.fromkeys(
+        ("files", "lines", "clashes", "validation rows", "documents"), 0
+    )
+    conn = sqlite3.connect(out_db)
+    conn.executescript(SCHEMA)
+    try:
+        for shard_dir in shard_dirs:
+            for entry in sorted(os.scandir(shard_dir), key=lambda entry: entry.name):
+                if entry.is_dir() and is_output_dir(entry.name):
+                    merge_output_dir(
+                        entry.path, os.path.join(out_dir, entry.name), counts
+                    )
+            shard_db = os.path.join(shard_dir, db_name)
+            if os.path.isfile(shard_db):
+                merge_database(shard_db, conn, counts)
+            print(f"Merged {shard_dir}")
+        summary = conn.execute(
+            "SELECT vendor, status, COUNT(*) FROM validation_results"
+            " GROUP BY vendor, status ORDER BY vendor, status"
+        ).fetchall()
+    finally:
+        conn.close()
+    return counts, summary
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3:
+        sys.exit("usage: mergeshards.py out_dir shard_dir...")
+    counts, summary = merge_shards(sys.argv[1], sys.argv[2:])
+
+    print("\nValidation results by vendor:")
+    for vendor, status, count in summary:
+        print(f"  {vendor:12s} {status:8s} {count:7d}")
+    print("\n" + ", ".join(f"{count} {name}" for name, count in counts.items()))
+    sys.exit(1 if counts["clashes"] else 0)
@@ -1,7 +1,12 @@
-import fitz  # PyMuPDF
 import os
 import re
-import json
+from pipeline import process_invoices
+from resultstore import open_output_store
+from utils import (
+    get_pdf_files,
+    shard_files,
+    skip_duplicates,
+)
 
 # You must ensure that `multicolumn.py` exists and defines `column_boxes`
 from multicolumn import column_boxes  # Ensure this exists and works correctly
@@ -11,21 +16,13 @@ input_dir = "./allinvoices"
 output_dir_txt = "Vacotxtfile"
 output_dir_json = "Vacojsonfile"
 validation_output_dir = "Vacovalidatejsontext"
+file_prefix = "vac"
 
 # Create output directories if they don't exist
 os.makedirs(output_dir_txt, exist_ok=True)
 os.makedirs(output_dir_json, exist_ok=True)
 os.makedirs(validation_output_dir, exist_ok=True)
 
-# Get list of PDF files starting with "vac"
-file_names = [
-    os.path.join(input_dir, item)
-    for item in os.listdir(input_dir)
-    if os.path.isfile(os.path.join(input_dir, item))
-    and item.lower().startswith("vac")
-    and item.lower().endswith(".pdf")
-]
-
 
 # Helper extraction function
 def extract(pattern, source, default=""):
@@ -33,294 +30,203 @@ def extract(pattern, source, default=""):
     return match.group(1).strip() if match else default
 
 
-def validate_json_vs_text(json_path, txt_path, output_dir):
-    with open(json_path, "r", encoding="utf-8") as jf:
-        data = json.load(jf)
-
-    with open(txt_path, "r", encoding="utf-8") as tf:
-        text = tf.read()
-
-    validation_results = []
-
-    def check_value_in_text(key, value, parent_key=""):
-        if isinstance(value, dict):
-            for k, v in value.items():
-                check_value_in_text(
-                    k, v, parent_key=f"{parent_key}.{key}" if parent_key else key
-                )
-        elif isinstance(value, list):
-            for i, item in enumerate(value):
-                if isinstance(item, dict):
-                    for k, v in item.items():
-                        check_value_in_text(
-                            k,
-                            v,
-                            parent_key=(
-                                f"{parent_key}.{key}[{i}]"
-                                if parent_key
-                                else f"{key}[{i}]"
-                            ),
-                        )
-                else:
-                    val = str(item)
-                    idx = text.find(val)
-                    full_key = (
-                        f"{parent_key}.{key}[{i}]" if parent_key else f"{key}[{i}]"
-                    )
-                    validation_results.append(
-                        f"{full_key} : '{val}' found at index {idx}"
-                    )
-        else:
-            val = str(value).strip()
-            if val:
-                idx = text.find(val)
-                full_key = f"{parent_key}.{key}" if parent_key else key
-                validation_results.append(f"{full_key} : '{val}' found at index {idx}")
-
-    check_value_in_text("", data)
-
-    # Separate found and not found entries
-    found_entries = [
-        line for line in validation_results if not line.endswith("index -1")
-    ]
-    not_found_entries = [
-        line for line in validation_results if line.endswith("index -1")
-    ]
-
-    base_name = os.path.splitext(os.path.basename(json_path))[0]
-    validation_txt_path = os.path.join(output_dir, f"{base_name}.txt")
-
-    with open(validation_txt_path, "w", encoding="utf-8") as vf:
-        vf.write("\n".join(validation_results))
-        if not_found_entries:
-            vf.write("\n\n--- NOT FOUND VALUES ---\n")
-            vf.write("\n".join(not_found_entries))
-
-    print(f"Validation file saved: {validation_txt_path}")
-
-
-# Main processing loop
-for pdf_path in file_names:
-    base_filename = os.path.splitext(os.path.basename(pdf_path))[0]
-    txt_file_path = os.path.join(output_dir_txt, f"{base_filename}.txt")
-    json_file_path = os.path.join(output_dir_json, f"{base_filename}.json")
-
-    try:
-        print(f"Processing PDF: {pdf_path}")
-        doc = fitz.open(pdf_path)
-        full_text = ""
-
-        for page in doc:
-            bboxes = column_boxes(page, footer_margin=50, no_image_text=True)
-            for rect in bboxes:
-                try:
-                    text = page.get_text(clip=rect, sort=True)
-                    full_text += text + "\n\n"
-                except Exception as e:
-                    print(
-                        f"Error extracting text from rectangle on page {page.number + 1}: {e}"
-                    )
-
-        with open(txt_file_path, "w", encoding="utf-8") as f:
-            f.write(full_text)
-        print(f"Text saved to: {txt_file_path}")
-
-        # --- Begin JSON Extraction ---
-        with open(txt_file_path, "r", encoding="utf-8") as file:
-            text = file.read()
-
-        with open(txt_file_path, "r", encoding="utf-8") as file:
-            lines = [line.strip() for line in file.readlines()]
-
-        # -------------------------
-        # Supplier Details
-        # -------------------------
-        supplier_details = {
-            "name": "",
-            "address": "",
-            "gstin_uin": extract(r"GSTIN/UIN\s*:\s*(\S+)", text),
-            "state_name": extract(r"State Name\s*:\s*(.+?),\s*Code\s*:\s*\d+", text),
-            "state_code": extract(r"State Name\s*:\s*.+?,\s*Code\s*:\s*(\d+)", text),
-            "email": extract(r"E-Mail\s*:\s*(.+)", text),
-        }
-
-        gstin_index = next(
-            (i for i, line in enumerate(lines) if "GSTIN/UIN" in line), None
-        )
-        if gstin_index is not None:
-            block = lines[max(0, gstin_index - 6) : gstin_index]
-            block = [line.strip() for line in block if line.strip()]
-
-            name_candidates = [
-                line
-                for line in block
-                if re.search(r"(Vasanth|Vaco|and Co|Chartered)", line, re.IGNORECASE)
-            ]
-            if name_candidates:
-                supplier_details["name"] = name_candidates[0]
-                name_index = block.index(name_candidates[0])
-                address_lines = block[name_index + 1 :]
-                supplier_details["address"] = ", ".join(address_lines).strip()
-
-        # -------------------------
-        # Buyer Details
-        # -------------------------
-        buyer_details = {
-            "name": extract(r"Buyer\s*\n([^\n]+)", text),
-            "address": extract(r"Buyer\s*\n[^\n]+\n(.+\n.+\n.+)", text).replace(
-                "\n", ", "
-            ),
-            "gstin_uin": extract(r"GSTIN/UIN\s*:\s*(\S+)", text),
-            "state_name": extract(r"State Name\s*:\s*(.+?), Code\s*:\s*\d+", text),
-            "state_code": extract(r"State Name\s*:\s*.+?, Code\s*:\s*(\d+)", text),
-        }
-
-        # -------------------------
-        # Invoice Details
-        # -------------------------
-        invoice_keys = [
-            "Invoice No.",
-            "Delivery Note",
-            "Supplier's Ref.",
-            "Buyer's Order No.",
-            "Despatch Document No.",
-            "Despatched through",
-            "Dated",
-            "Mode/Terms of Payment",
-            "Other Reference(s)",
-            "Delivery Note Date",
-            "Destination",
-            "Terms of Delivery",
+# Parse the extracted text of one invoice into the output JSON structure
+def parse_invoice(text):
+    # --- Begin JSON Extraction ---
+    lines = [line.strip() for line in text.splitlines()]
+
+    # -------------------------
+    # Supplier Details
+    # -------------------------
+    supplier_details = {
+        "name": "",
+        "address": "",
+        "gstin_uin": extract(r"GSTIN/UIN\s*:\s*(\S+)", text),
+        "state_name": extract(r"State Name\s*:\s*(.+?),\s*Code\s*:\s*\d+", text),
+        "state_code": extract(r"State Name\s*:\s*.+?,\s*Code\s*:\s*(\d+)", text),
+        "email": extract(r"E-Mail\s*:\s*(.+)", text),
+    }
+
+    gstin_index = next((i for i, line in enumerate(lines) if "GSTIN/UIN" in line), None)
+    if gstin_index is not None:
+        block = lines[max(0, gstin_index - 6) : gstin_index]
+        block = [line.strip() for line in block if line.strip()]
+
+        name_candidates = [
+            line
+            for line in block
+            if re.search(r"(Vasanth|Vaco|and Co|Chartered)", line, re.IGNORECASE)
         ]
+        if name_candidates:
+            supplier_details["name"] = name_candidates[0]
+            name_index = block.index(name_candidates[0])
+            address_lines = block[name_index + 1 :]
+            supplier_details["address"] = ", ".join(address_lines).strip()
+
+    # -------------------------
+    # Buyer Details
+    # -------------------------
+    buyer_details = {
+        "name": extract(r"Buyer\s*\n([^\n]+)", text),
+        "address": extract(r"Buyer\s*\n[^\n]+\n(.+\n.+\n.+)", text).replace("\n", ", "),
+        "gstin_uin": extract(r"GSTIN/UIN\s*:\s*(\S+)", text),
+        "state_name": extract(r"State Name\s*:\s*(.+?), Code\s*:\s*\d+", text),
+        "state_code": extract(r"State Name\s*:\s*.+?, Code\s*:\s*(\d+)", text),
+    }
+
+    # -------------------------
+    # Invoice Details
+    # -------------------------
+    invoice_keys = [
+        "Invoice No.",
+        "Delivery Note",
+        "Supplier's Ref.",
+        "Buyer's Order No.",
+        "Despatch Document No.",
+        "Despatched through",
+        "Dated",
+        "Mode/Terms of Payment",
+        "Other Reference(s)",
+        "Delivery Note Date",
+        "Destination",
+        "Terms of Delivery",
+    ]
 
-        invoice_details = {key.replace(".", "").strip(): "" for key in invoice_keys}
-
-        for i in range(len(lines) - 1):
-            current_line = lines[i].strip()
-            next_line = lines[i + 1].strip()
-            for key in invoice_keys:
-                clean_key = key.replace(".", "").strip()
-                if key in current_line and invoice_details[clean_key] == "":
-                    invoice_details[clean_key] = next_line if next_line else ""
-
-        # -------------------------
-        # Line Items
-        # -------------------------
-        line_items = []
-        item_pattern = re.compile(
-            r"^(\d+)\s+(.*?)\s{2,}(\d{6,8})?\s{2,}([\d,]+\.\d{2})$"
-        )
-
-        i = 0
-        while i < len(lines):
-            match = item_pattern.match(lines[i])
-            if match:
-                sl_no = match.group(1)
-                description = match.group(2).strip()
-                hsn_sac = match.group(3) or ""
-                amount = match.group(4)
-
-                if re.search(r"(CGST|SGST|IGST)", description, re.IGNORECASE):
-                    i += 1
-                    continue
-
-                full_desc = [description]
-                j = i + 1
-                while j < len(lines):
-                    next_line = lines[j].strip()
-                    if (
-                        item_pattern.match(lines[j])
-                        or next_line.startswith("Total")
-                        or re.match(r"^\d+\s+(CGST|SGST|IGST)", next_line)
-                    ):
-                        break
-                    if next_line:
-                        full_desc.append(next_line)
-                    j += 1
-
-                line_items.append(
-                    {
-                        "Sl No": sl_no,
-                        "Particulars": " ".join(full_desc),
-                        "HSN/SAC": hsn_sac,
-                        "Rate": "",
-                        "per": "",
-                        "Amount": amount,
-                    }
-                )
-                i = j
-            else:
+    invoice_details = {key.replace(".", "").strip(): "" for key in invoice_keys}
+
+    for i in range(len(lines) - 1):
+        current_line = lines[i].strip()
+        next_line = lines[i + 1].strip()
+        for key in invoice_keys:
+            clean_key = key.replace(".", "").strip()
+            if key in current_line and invoice_details[clean_key] == "":
+                invoice_details[clean_key] = next_line if next_line else ""
+
+    # -------------------------
+    # Line Items
+    # -------------------------
+    line_items = []
+    item_pattern = re.compile(r"^(\d+)\s+(.*?)\s{2,}(\d{6,8})?\s{2,}([\d,]+\.\d{2})$")
+
+    i = 0
+    while i < len(lines):
+        match = item_pattern.match(lines[i])
+        if match:
+            sl_no = match.group(1)
+            description = match.group(2).strip()
+            hsn_sac = match.group(3) or ""
+            amount = match.group(4)
+
+            if re.search(r"(CGST|SGST|IGST)", description, re.IGNORECASE):
                 i += 1
-
-        # -------------------------
-        # Tax Summary
-        # -------------------------
-        tax_summary = {
-            "CGST Rate (%)": "",
-            "CGST Amount": "",
-            "SGST Rate (%)": "",
-            "SGST Amount": "",
-        }
-
-        for line in lines:
-            if "CGST" in line:
-                tax_summary["CGST Rate (%)"] = extract(r"CGST\s+(\d+)\s*%", line)
-                tax_summary["CGST Amount"] = extract(
-                    r"(\d{1,3}(?:,\d{3})*\.\d{2})", line
-                )
-            elif "SGST" in line:
-                tax_summary["SGST Rate (%)"] = extract(r"SGST\s+(\d+)\s*%", line)
-                tax_summary["SGST Amount"] = extract(
-                    r"(\d{1,3}(?:,\d{3})*\.\d{2})", line
-                )
-
-        # -------------------------
-        # Totals
-        # -------------------------
-        totals = {"Total Amount": extract(r"Total\s+₹?\s*([\d,]+\.\d{2})", text)}
-
-        # -------------------------
-        # Amount in Words
-        # -------------------------
-        amount_chargeable_words = ""
-        for i, line in enumerate(lines):
-            if "Amount Chargeable (in words)" in line:
-                amount_chargeable_words = (
-                    lines[i + 1].strip() if i + 1 < len(lines) else ""
-                )
-                break
-
-        # -------------------------
-        # Bank Details
-        # -------------------------
-        bank_details = {
-            "Bank Name": extract(r"Bank Name\s*:\s*(.+)", text),
-            "Account Number": extract(r"A/c\s*No\.?\s*:\s*(\d+)", text),
-            "Branch_IFSC": extract(r"Branch\s*&\s*IFS\s*Code\s*:\s*(.+)", text),
-        }
-
-        # -------------------------
-        # Final Output Dictionary
-        # -------------------------
-        output_data = {
-            "supplier_details": supplier_details,
-            "buyer_details": buyer_details,
-            "invoice_details": invoice_details,
-            "line_items": line_items,
-            "tax_summary": tax_summary,
-            "totals": totals,
-            "amount_chargeable_in_words": amount_chargeable_words,
-            "hsn_summary": [],  # optional
-            "bank_details": bank_details,
-        }
-
-        with open(json_file_path, "w", encoding="utf-8") as json_file:
-            json.dump(output_data, json_file, indent=4)
-
-        print(f"JSON saved to: {json_file_path}\n")
-        # --- Validation step ---
-        validate_json_vs_text(json_file_path, txt_file_path, validation_output_dir)
-        print()
-
-    except Exception as e:
-        print(f"Failed to process {pdf_path}: {e}\n")
+                continue
+
+            full_desc = [description]
+            j = i + 1
+            while j < len(lines):
+                next_line = lines[j].strip()
+                if (
+                    item_pattern.match(lines[j])
+                    or next_line.startswith("Total")
+                    or re.match(r"^\d+\s+(CGST|SGST|IGST)", next_line)
+                ):
+                    break
+                if next_line:
+                    full_desc.append(next_line)
+                j += 1
+
+            line_items.append(
+                {
+                    "Sl No": sl_no,
+                    "Particulars": " ".join(full_desc),
+                    "HSN/SAC": hsn_sac,
+                    "Rate": "",
+                    "per": "",
+                    "Amount": amount,
+                }
+            )
+            i = j
+        else:
+            i += 1
+
+    # -------------------------
+    # Tax Summary
+    # -------------------------
+    tax_summary = {
+        "CGST Rate (%)": "",
+        "CGST Amount": "",
+        "SGST Rate (%)": "",
+        "SGST Amount": "",
+    }
+
+    for line in lines:
+        if "CGST" in line:
+            tax_summary["CGST Rate (%)"] = extract(r"CGST\s+(\d+)\s*%", line)
+            tax_summary["CGST Amount"] = extract(r"(\d{1,3}(?:,\d{3})*\.\d{2})", line)
+        elif "SGST" in line:
+            tax_summary["SGST Rate (%)"] = extract(r"SGST\s+(\d+)\s*%", line)
+            tax_summary["SGST Amount"] = extract(r"(\d{1,3}(?:,\d{3})*\.\d{2})", line)
+
+    # -------------------------
+    # Totals
+    # -------------------------
+    totals = {"Total Amount": extract(r"Total\s+₹?\s*([\d,]+\.\d{2})", text)}
+
+    # -------------------------
+    # Amount in Words
+    # -------------------------
+    amount_chargeable_words = ""
+    for i, line in enumerate(lines):
+        if "Amount Chargeable (in words)" in line:
+            amount_chargeable_words = lines[i + 1].strip() if i + 1 < len(lines) else ""
+            break
+
+    # -------------------------
+    # Bank Details
+    # -------------------------
+    bank_details = {
+        "Bank Name": extract(r"Bank Name\s*:\s*(.+)", text),
+        "Account Number": extract(r"A/c\s*No\.?\s*:\s*(\d+)", text),
+        "Branch_IFSC": extract(r"Branch\s*&\s*IFS\s*Code\s*:\s*(.+)", text),
+    }
+
+    # -------------------------
+    # Final Output Dictionary
+    # -------------------------
+    output_data = {
+        "supplier_details": supplier_details,
+        "buyer_details": buyer_details,
+        "invoice_details": invoice_details,
+        "line_items": line_items,
+        "tax_summary": tax_summary,
+        "totals": totals,
+        "amount_chargeable_in_words": amount_chargeable_words,
+        "hsn_summary": [],  # optional
+        "bank_details": bank_details,
+    }
+
+    return output_data
+
+
+if __name__ == "__main__":
+    # Validation outcomes go to SQLite too; INVOICE_OUTPUT_BACKEND (files, sqlite
+    # or ndjson) picks where the text and JSON outputs are written
+    results_store = open_output_store()
+
+    # Get list of PDF files starting with "vac"
+    # --shard i/N keeps this machine's part of them, see mergeshards.py
+    pdf_files = shard_files(get_pdf_files(input_dir, file_prefix))
+    file_names = skip_duplicates(pdf_files, output_dir_json)
+
+    # INVOICE_PIPELINE runs extraction, parsing, writing and validation as
+    # overlapping stages; unset, each PDF goes through them in turn
+    process_invoices(
+        file_names,
+        parse_invoice,
+        column_boxes,
+        output_dir_txt,
+        output_dir_json,
+        validation_output_dir,
+        store=results_store,
+    )
+    results_store.close()
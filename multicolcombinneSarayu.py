@@ -1,14 +1,15 @@
 import fitz  # PyMuPDF
 import os
 import re
-import json
+from pipeline import process_invoices
+from resultstore import open_output_store
 import utils
 
 from utils import (
     get_pdf_files,
-    extract_and_read_pdf_text,
+    shard_files,
+    skip_duplicates,
     extract,
-    validate_json_vs_text,
 )
 
 
@@ -27,7 +28,6 @@ output_dir_txt = "Sarayutextfile"
 output_dir_json = "Sarayujsonfile"
 validation_output_dir = "Sarayuvalidatejsontext"
 file_prefix = "sar"
-file_names = get_pdf_files(input_dir, file_prefix)
 
 # Create output directories if they don't exist
 os.makedirs(output_dir_txt, exist_ok=True)
@@ -35,179 +35,187 @@ os.makedirs(output_dir_json, exist_ok=True)
 os.makedirs(validation_output_dir, exist_ok=True)
 
 
-# MAIN LOOP FOR ALL PDFs
-for pdf_path in file_names:
-    base_filename = os.path.splitext(os.path.basename(pdf_path))[0]
-    txt_file_path = os.path.join(output_dir_txt, f"{base_filename}.txt")
-    json_file_path = os.path.join(output_dir_json, f"{base_filename}.json")
-
-    try:
-        text = extract_and_read_pdf_text(pdf_path, txt_file_path, column_boxes)
-        lines = [line.strip() for line in text.splitlines() if line.strip()]
-
-        # -------------------------
-        # Supplier Details
-        # -------------------------
-        supplier_details = {
-            "name": lines[0] if lines else "",
-            "address": ", ".join(lines[1:4]) if len(lines) > 3 else "",
-            "gstin_uin": extract(r"GSTIN/UIN:\s*(\S+)", text),
-            "state_name": extract(r"State Name\s*:\s*(.+?),\s*Code", text),
-            "state_code": extract(r"State Name\s*:\s*.+?,\s*Code\s*:\s*(\d+)", text),
-            "email": extract(r"E[-\s]?Mail\s*:\s*(\S+)", text),
-        }
-
-        # -------------------------
-        # Buyer Details
-        # -------------------------
-        buyer_details = {
-            "name": "Irillic Pvt. Ltd.",
-            "address": ", ".join(
-                [
-                    lines[lines.index("Buyer") + 1] if "Buyer" in lines else "",
-                    lines[lines.index("Buyer") + 2] if "Buyer" in lines else "",
-                ]
-            ),
-            "gstin_uin": extract(r"GSTIN/UIN\s*:\s*(\S+)", text),
-            "state_name": extract(r"State Name\s*:\s*(.+?),\s*Code", text),
-            "state_code": extract(r"State Name\s*:\s*.+?,\s*Code\s*:\s*(\d+)", text),
-            "place_of_supply": extract(r"Place of Supply\s*:\s*(.+)", text),
-            "contact_person": extract(r"Contact person\s*:\s*(.+)", text),
-            "contact": extract(r"Contact\s*:\s*(\S+)", text),
-        }
-
-        # -------------------------
-        # Invoice Details
-        # -------------------------
-        invoice_labels = [
-            "Invoice No.",
-            "Delivery Note",
-            "Supplier’s Ref.",
-            "Buyer’s Order No.",
-            "Despatch Document No.",
-            "Despatched through",
-            "Dated",
-            "Mode/Terms of Payment",
-            "Other Reference(s)",
-            "Delivery Note Date",
-            "Destination",
-            "Terms of Delivery",
-        ]
-
-        invoice_details = {
-            label.replace(":", "").replace("’", "'").strip(): ""
-            for label in invoice_labels
-        }
-
-        for i in range(len(lines) - 1):
-            key = lines[i].strip().replace(":", "").replace("’", "'")
-            val = lines[i + 1].strip()
-            if (
-                key in invoice_details
-                and val not in invoice_labels
-                and not val.startswith("Sl ")
-            ):
-                invoice_details[key] = val
-
-        # -------------------------
-        # Line Items
-        # -------------------------
-        line_items = []
-        i = 0
-        while i < len(lines):
-            match = re.match(
-                r"^(\d+)\s+([A-Za-z\s&()\-]+)\s+(\d{6,8})\s+(\d+)\s*%\s+(\d+)\s+([A-Za-z]+)\s+(\d+)\s+([A-Za-z]+)\s+([\d,]+\.\d{2})",
-                lines[i],
-            )
-            if match:
-                sl_no = match.group(1)
-                desc = match.group(2).strip()
-                hsn = match.group(3)
-                gst_rate = match.group(4)
-                qty = f"{match.group(5)} {match.group(6)}"
-                rate = match.group(7)
-                per = match.group(8)
-                amount = match.group(9)
-
-                if i + 1 < len(lines) and not lines[i + 1].startswith(
-                    tuple("1234567890")
-                ):
-                    desc += " " + lines[i + 1].strip()
-                    i += 1
-
-                line_items.append(
-                    {
-                        "Sl No": sl_no,
-                        "Description of Goods": desc,
-                        "HSN/SAC": hsn,
-                        "GST Rate": gst_rate,
-                        "Quantity": qty,
-                        "Rate": rate,
-                        "per": per,
-                        "Amount": amount,
-                    }
-                )
-            i += 1
-
-        # -------------------------
-        # Tax Summary
-        # -------------------------
-        tax_summary = {
-            "CGST Amount": extract(r"CGST\s+([\d,.]+)", text),
-            "SGST Amount": extract(r"SGST\s+([\d,.]+)", text),
-        }
-
-        # -------------------------
-        # HSN Summary
-        # -------------------------
-        hsn_summary = []
-        hsn_pattern = re.compile(
-            r"(\d{6,8})\s+([\d,.]+)\s+(\d+)%\s+([\d,.]+)\s+(\d+)%\s+([\d,.]+)\s+([\d,.]+)"
+# Parse the extracted text of one invoice into the output JSON structure
+def parse_invoice(text):
+    lines = [line.strip() for line in text.splitlines() if line.strip()]
+
+    # -------------------------
+    # Supplier Details
+    # -------------------------
+    supplier_details = {
+        "name": lines[0] if lines else "",
+        "address": ", ".join(lines[1:4]) if len(lines) > 3 else "",
+        "gstin_uin": extract(r"GSTIN/UIN:\s*(\S+)", text),
+        "state_name": extract(r"State Name\s*:\s*(.+?),\s*Code", text),
+        "state_code": extract(r"State Name\s*:\s*.+?,\s*Code\s*:\s*(\d+)", text),
+        "email": extract(r"E[-\s]?Mail\s*:\s*(\S+)", text),
+    }
+
+    # -------------------------
+    # Buyer Details
+    # -------------------------
+    buyer_details = {
+        "name": "Irillic Pvt. Ltd.",
+        "address": ", ".join(
+            [
+                lines[lines.index("Buyer") + 1] if "Buyer" in lines else "",
+                lines[lines.index("Buyer") + 2] if "Buyer" in lines else "",
+            ]
+        ),
+        "gstin_uin": extract(r"GSTIN/UIN\s*:\s*(\S+)", text),
+        "state_name": extract(r"State Name\s*:\s*(.+?),\s*Code", text),
+        "state_code": extract(r"State Name\s*:\s*.+?,\s*Code\s*:\s*(\d+)", text),
+        "place_of_supply": extract(r"Place of Supply\s*:\s*(.+)", text),
+        "contact_person": extract(r"Contact person\s*:\s*(.+)", text),
+        "contact": extract(r"Contact\s*:\s*(\S+)", text),
+    }
+
+    # -------------------------
+    # Invoice Details
+    # -------------------------
+    invoice_labels = [
+        "Invoice No.",
+        "Delivery Note",
+        "Supplier’s Ref.",
+        "Buyer’s Order No.",
+        "Despatch Document No.",
+        "Despatched through",
+        "Dated",
+        "Mode/Terms of Payment",
+        "Other Reference(s)",
+        "Delivery Note Date",
+        "Destination",
+        "Terms of Delivery",
+    ]
+
+    invoice_details = {
+        label.replace(":", "").replace("’", "'").strip(): ""
+        for label in invoice_labels
+    }
+
+    for i in range(len(lines) - 1):
+        key = lines[i].strip().replace(":", "").replace("’", "'")
+        val = lines[i + 1].strip()
+        if (
+            key in invoice_details
+            and val not in invoice_labels
+            and not val.startswith("Sl ")
+        ):
+            invoice_details[key] = val
+
+    # -------------------------
+    # Line Items
+    # -------------------------
+    line_items = []
+    i = 0
+    while i < len(lines):
+        match = re.match(
+            r"^(\d+)\s+([A-Za-z\s&()\-]+)\s+(\d{6,8})\s+(\d+)\s*%\s+(\d+)\s+([A-Za-z]+)\s+(\d+)\s+([A-Za-z]+)\s+([\d,]+\.\d{2})",
+            lines[i],
         )
-        matches = hsn_pattern.findall(text)
-        for match in matches:
-            hsn_summary.append(
+        if match:
+            sl_no = match.group(1)
+            desc = match.group(2).strip()
+            hsn = match.group(3)
+            gst_rate = match.group(4)
+            qty = f"{match.group(5)} {match.group(6)}"
+            rate = match.group(7)
+            per = match.group(8)
+            amount = match.group(9)
+
+            if i + 1 < len(lines) and not lines[i + 1].startswith(
+                tuple("1234567890")
+            ):
+                desc += " " + lines[i + 1].strip()
+                i += 1
+
+            line_items.append(
                 {
-                    "HSN/SAC": match[0],
-                    "Taxable Value": match[1],
-                    "Central Tax Rate": match[2] + "%",
-                    "Central Tax Amount": match[3],
-                    "State Tax Rate": match[4] + "%",
-                    "State Tax Amount": match[5],
-                    "Total Tax Amount": match[6],
+                    "Sl No": sl_no,
+                    "Description of Goods": desc,
+                    "HSN/SAC": hsn,
+                    "GST Rate": gst_rate,
+                    "Quantity": qty,
+                    "Rate": rate,
+                    "per": per,
+                    "Amount": amount,
                 }
             )
+        i += 1
+
+    # -------------------------
+    # Tax Summary
+    # -------------------------
+    tax_summary = {
+        "CGST Amount": extract(r"CGST\s+([\d,.]+)", text),
+        "SGST Amount": extract(r"SGST\s+([\d,.]+)", text),
+    }
+
+    # -------------------------
+    # HSN Summary
+    # -------------------------
+    hsn_summary = []
+    hsn_pattern = re.compile(
+        r"(\d{6,8})\s+([\d,.]+)\s+(\d+)%\s+([\d,.]+)\s+(\d+)%\s+([\d,.]+)\s+([\d,.]+)"
+    )
+    matches = hsn_pattern.findall(text)
+    for match in matches:
+        hsn_summary.append(
+            {
+                "HSN/SAC": match[0],
+                "Taxable Value": match[1],
+                "Central Tax Rate": match[2] + "%",
+                "Central Tax Amount": match[3],
+                "State Tax Rate": match[4] + "%",
+                "State Tax Amount": match[5],
+                "Total Tax Amount": match[6],
+            }
+        )
 
-        # -------------------------
-        # Bank Details
-        # -------------------------
-        bank_details = {
-            "Bank Name": extract(r"Bank Name\s*:\s*(.+)", text),
-            "Account Number": extract(r"A/c No\.?\s*:\s*(\d+)", text),
-            "Branch & IFSC": extract(r"Branch & IFS Code\s*:\s*(.+)", text),
-        }
-
-        # -------------------------
-        # Final Output
-        # -------------------------
-        output_data = {
-            "supplier_details": supplier_details,
-            "buyer_details": buyer_details,
-            "invoice_details": invoice_details,
-            "line_items": line_items,
-            "tax_summary": tax_summary,
-            "hsn_summary": hsn_summary,
-            "bank_details": bank_details,
-        }
-
-        with open(json_file_path, "w", encoding="utf-8") as f:
-            json.dump(output_data, f, indent=4)
-
-        print(f"JSON saved to: {json_file_path}\n")
-
-        # --- Validation step ---
-        validate_json_vs_text(json_file_path, txt_file_path, validation_output_dir)
-        print("------------------------------------------")
-
-    except Exception as e:
-        print(f"Failed to process {pdf_path}: {e}\n")
+    # -------------------------
+    # Bank Details
+    # -------------------------
+    bank_details = {
+        "Bank Name": extract(r"Bank Name\s*:\s*(.+)", text),
+        "Account Number": extract(r"A/c No\.?\s*:\s*(\d+)", text),
+        "Branch & IFSC": extract(r"Branch & IFS Code\s*:\s*(.+)", text),
+    }
+
+    # -------------------------
+    # Final Output
+    # -------------------------
+    output_data = {
+        "supplier_details": supplier_details,
+        "buyer_details": buyer_details,
+        "invoice_details": invoice_details,
+        "line_items": line_items,
+        "tax_summary": tax_summary,
+        "hsn_summary": hsn_summary,
+        "bank_details": bank_details,
+    }
+
+    return output_data
+
+
+if __name__ == "__main__":
+    # Validation outcomes go to SQLite too; INVOICE_OUTPUT_BACKEND (files, sqlite
+    # or ndjson) picks where the text and JSON outputs are written
+    results_store = open_output_store()
+
+    # PDF files starting with file_prefix; --shard i/N keeps this machine's
+    # part of them, see mergeshards.py
+    pdf_files = shard_files(get_pdf_files(input_dir, file_prefix))
+    file_names = skip_duplicates(pdf_files, output_dir_json)
+
+    # INVOICE_PIPELINE runs extraction, parsing, writing and validation as
+    # overlapping stages; unset, each PDF goes through them in turn
+    process_invoices(
+        file_names,
+        parse_invoice,
+        column_boxes,
+        output_dir_txt,
+        output_dir_json,
+        validation_output_dir,
+        store=results_store,
+    )
+    results_store.close()
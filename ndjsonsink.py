@@ -0,0 +1,114 @@
+import os
+import glob
+import jsoncodec
+import time
+import threading
+from datetime import datetime
+
+
+class NdjsonSink:
+    """Run-level NDJSON output, one compact JSON object per invoice.
+
+    Instead of one pretty-printed file per invoice, every JSON output
+    directory gets a single run-<timestamp>.ndjson file that records are
+    appended to. Flush + fsync happens every sync_every records or
+    sync_interval seconds, whichever comes first, and on close. Safe to
+    share between pipeline threads.
+    """
+
+    def __init__(self, sync_every=100, sync_interval=5.0):
+        self.run_name = datetime.now().strftime("run-%Y%m%dT%H%M%S")
+        self.sync_every = sync_every
+        self.sync_interval = sync_interval
+        self.files = {}  # output dir -> open file
+        self.unsynced = 0
+        self.last_sync = time.monotonic()
+        self.written = {}  # json path -> serialized data, until validated
+        self.lock = threading.Lock()
+
+    def get_path(self, output_dir):
+        return os.path.join(output_dir, f"{self.run_name}.ndjson")
+
+    def write(self, json_file_path, output_data):
+        with self.lock:
+            return self._write(json_file_path, output_data)
+
+    def _write(self, json_file_path, output_data):
+        output_dir = os.path.dirname(json_file_path) or "."
+        f = self.files.get(output_dir)
+        if f is None:
+            f = open(self.get_path(output_dir), "ab")
+            self.files[output_dir] = f
+
+        document = os.path.splitext(os.path.basename(json_file_path))[0]
+        serialized = jsoncodec.dumps(output_data, compact=True)
+        record = b'{"document":%s,"data":%s}\n' % (
+            jsoncodec.dumps(document, compact=True),
+            serialized,
+        )
+        f.write(record)
+        self.written[json_file_path] = serialized
+
+        self.unsynced += 1
+        if (
+            self.unsynced >= self.sync_every
+            or time.monotonic() - self.last_sync >= self.sync_interval
+        ):
+            self.sync()
+        return self.get_path(output_dir)
+
+    # serialized data of a document written this run, handed over once
+    # for its validation
+    def get(self, json_file_path):
+        with self.lock:
+            return self.written.pop(json_file_path, None)
+
+    def sync(self):
+        for f in self.files.values():
+            f.flush()
+            os.fsync(f.fileno())
+        self.unsynced = 0
+        self.last_sync = time.monotonic()
+
+    def flush(self):
+        with self.lock:
+            self.sync()
+
+    def close(self):
+        with self.lock:
+            self.sync()
+            for f in self.files.values():
+                f.close()
+            self.files = {}
+
+
+# Stream the records of one or more NDJSON output files
+def read_ndjson(*paths):
+    for path in paths:
+        with open(path, "rb") as f:
+            for line in f:
+                try:
+                    yield jsoncodec.loads(line)
+                except ValueError:
+                    continue  # blank or torn last line from an interrupted run
+
+
+def latest_json_outputs(json_dir):
+    """The newest JSON output of every document in json_dir.
+
+    Returns {document: (json_path, data)}, with json_path for a per-file
+    output and data for an NDJSON record (the other one None). A document
+    written more than once, as a file or by several NDJSON runs, gets the
+    output of the most recently modified file, the last record within one.
+    """
+    latest = {}  # document -> (file mtime, json path, record data)
+    for path in glob.glob(os.path.join(json_dir, "*.json")):
+        document = os.path.splitext(os.path.basename(path))[0]
+        latest[document] = (os.stat(path).st_mtime_ns, path, None)
+    for path in sorted(glob.glob(os.path.join(json_dir, "*.ndjson"))):
+        mtime = os.stat(path).st_mtime_ns
+        for record in read_ndjson(path):
+            document = record["document"]
+            if document not in latest or latest[document][0] <= mtime:
+                latest[document] = (mtime, None, record["data"])
+    return {document: (path, data) for document, (_, path, data) in latest.items()}
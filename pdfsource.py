@@ -0,0 +1,114 @@
+import os
+import mmap
+import tarfile
+import zipfile
+import fnmatch
+from contextlib import contextmanager
+import fitz  # PyMuPDF
+
+# Files up to this size are read with one bulk read, bigger ones are mmap'ed;
+# either way MuPDF parses from memory instead of seeking around the file
+MMAP_THRESHOLD = int(os.environ.get("INVOICE_MMAP_THRESHOLD", 16 * 1024 * 1024))
+
+
+# Invoice bundles read in place, without unpacking them into allinvoices
+ARCHIVE_PATTERNS = ("*.zip", "*.tar", "*.tar.gz", "*.tgz", "*.tar.bz2", "*.tar.xz")
+
+
+class ArchiveMember(str):
+    """A PDF inside an archive, as the key "<archive path>!<member name>".
+
+    Folders inside the archive are joined with "!" as well, so the part
+    after the last "/" (what the vendor scripts use as output name) keeps
+    the archive name: "allinvoices/vaco_08.zip!inv_280_08.pdf". The
+    member's bytes are held in data.
+    """
+
+    def __new__(cls, archive_path, member_name, data):
+        key = super().__new__(cls, f"{archive_path}!{member_name.replace('/', '!')}")
+        key.archive_path = archive_path
+        key.member_name = member_name
+        key.data = data
+        return key
+
+    # rebuilt from its parts when sent to a worker process
+    def __reduce__(self):
+        return ArchiveMember, (self.archive_path, self.member_name, self.data)
+
+
+def is_archive(path):
+    name = os.path.basename(path).lower()
+    return any(fnmatch.fnmatchcase(name, pattern) for pattern in ARCHIVE_PATTERNS)
+
+
+def iter_archive(archive_path, match=None):
+    """Yield an ArchiveMember per file in a zip or tar archive.
+
+    match(member_name) picks the members to read; the others are skipped
+    without being decompressed where the format allows. Tar archives are
+    read as a stream, front to back.
+    """
+    if zipfile.is_zipfile(archive_path):
+        with zipfile.ZipFile(archive_path) as zf:
+            for info in zf.infolist():
+                if info.is_dir() or (match and not match(info.filename)):
+                    continue
+                with zf.open(info) as f:
+                    yield ArchiveMember(archive_path, info.filename, f.read())
+        return
+
+    with tarfile.open(archive_path, "r|*") as tf:
+        for member in tf:
+            if not member.isfile() or (match and not match(member.name)):
+                continue
+            f = tf.extractfile(member)
+            yield ArchiveMember(archive_path, member.name, f.read())
+
+
+# Printable name of a source: the path, or the name of a file object
+def source_name(source):
+    if isinstance(source, (str, os.PathLike)):
+        return os.fspath(source)
+    return getattr(source, "name", None) or "<memory>"
+
+
+# Empty MuPDF's store, its cache of decoded fonts, images and page resources,
+# which otherwise keeps growing across documents up to its size limit
+def release_pdf_memory():
+    fitz.TOOLS.store_shrink(100)
+
+
+@contextmanager
+def open_pdf(source, mmap_threshold=MMAP_THRESHOLD):
+    """Open a PDF from memory and close it when the block ends.
+
+    source is a file path, an ArchiveMember, PDF bytes (bytes, bytearray,
+    memoryview) or a binary file object; file objects are read completely.
+    Paths above mmap_threshold bytes are memory-mapped.
+    """
+    mapped = view = None
+    if isinstance(source, ArchiveMember):
+        data = source.data
+    elif isinstance(source, (str, os.PathLike)):
+        with open(source, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            if size > mmap_threshold:
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                view = memoryview(mapped)
+                data = view
+            else:
+                data = f.read()
+    elif isinstance(source, (bytes, bytearray, memoryview)):
+        data = source
+    else:
+        data = source.read()
+
+    doc = fitz.open(stream=data, filetype="pdf")
+    try:
+        yield doc
+    finally:
+        doc.close()
+        del doc, data
+        if mapped is not None:
+            view.release()
+            mapped.close()
@@ -0,0 +1,269 @@
+import os
+import time
+import queue
+import threading
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor
+from costmodel import CostModel
+from journal import RunJournal, get_resume
+from timebudget import DOC_BUDGET, MEMORY_BOUNDED, PAGE_BUDGET, WatchedExtractor
+from utils import (
+    extract_pdf_text,
+    save_pdf_text,
+    save_json_output,
+    validate_if_changed,
+)
+
+# INVOICE_SCHEDULE=cost hands the documents out longest-first by estimated cost
+SCHEDULE = os.environ.get("INVOICE_SCHEDULE", "")
+
+# INVOICE_PIPELINE unset runs each PDF through all stages before the next one;
+# "1" runs the stages side by side with DEFAULT_WORKERS, and per-stage counts
+# can be given as e.g. INVOICE_PIPELINE="extract=4,parse=1,write=2,validate=1"
+DEFAULT_WORKERS = {
+    "extract": os.cpu_count() or 1,
+    "parse": 1,
+    "write": 2,
+    "validate": 1,
+}
+QUEUE_SIZE = 8
+
+
+class Stage:
+    """One pipeline step: func(item) returns the item for the next stage.
+
+    func runs in `workers` threads, or with processes=True in a pool of
+    `workers` processes (func and the items must then be picklable).
+    """
+
+    def __init__(self, name, func, workers=1, processes=False):
+        self.name = name
+        self.func = func
+        self.workers = workers
+        self.processes = processes
+
+
+def parse_workers(spec):
+    if spec in ("", "0"):
+        return None
+    workers = dict(DEFAULT_WORKERS)
+    for part in spec.split(","):
+        if "=" in part:
+            name, count = part.split("=", 1)
+            workers[name.strip()] = max(1, int(count))
+    return workers
+
+
+def _call_in_pool(pool, func, item):
+    return pool.submit(func, item).result()
+
+
+def run_inline(items, stages, on_error=None):
+    """Each item through every stage in turn, on the calling thread."""
+    completed = 0
+    for item in items:
+        current = item
+        try:
+            for stage in stages:
+                current = stage.func(current)
+        except Exception as e:
+            if on_error is not None:
+                on_error(item, e)
+            continue
+        completed += 1
+    return completed
+
+
+def run_pipeline(items, stages, queue_size=QUEUE_SIZE, on_error=None):
+    """Run items through stages that overlap, one bounded queue per stage.
+
+    A stage blocks when the queue of the next one is full, so at most
+    about queue_size items per stage are in memory however fast the input
+    is listed. An item whose stage raises is passed to on_error and
+    dropped. Returns the number of items that went through every stage.
+    """
+    queues = [queue.Queue(maxsize=queue_size) for _ in stages]
+    done = object()
+    lock = threading.Lock()
+    running = [stage.workers for stage in stages]
+    completed = [0]
+
+    def worker(i, call):
+        next_queue = queues[i + 1] if i + 1 < len(stages) else None
+        while True:
+            item = queues[i].get()
+            if item is done:
+                break
+            try:
+                result = call(item)
+            except Exception as e:
+                if on_error is not None:
+                    on_error(item, e)
+                continue
+            if next_queue is not None:
+                next_queue.put(result)
+            else:
+                with lock:
+                    completed[0] += 1
+
+        # the last worker of a stage to finish closes the next stage
+        with lock:
+            running[i] -= 1
+            last = running[i] == 0
+        if last and next_queue is not None:
+            for _ in range(stages[i + 1].workers):
+                next_queue.put(done)
+
+    pools = []
+    threads = []
+    try:
+        for i, stage in enumerate(stages):
+            call = stage.func
+            if stage.processes:
+                pool = ProcessPoolExecutor(stage.workers)
+                pools.append(pool)
+                call = partial(_call_in_pool, pool, stage.func)
+            for n in range(stage.workers):
+                thread = threading.Thread(
+                    target=worker, args=(i, call), name=f"{stage.name}-{n}", daemon=True
+                )
+                thread.start()
+                threads.append(thread)
+
+        for item in items:
+            queues[0].put(item)
+        for _ in range(stages[0].workers):
+            queues[0].put(done)
+        for thread in threads:
+            thread.join()
+    finally:
+        for pool in pools:
+            pool.shutdown()
+    return completed[0]
+
+
+# column_boxes stage, run in a worker process
+def extract_job(job, column_boxes_func):
+    start = time.perf_counter()
+    job["full_text"], job["offset_map"] = extract_pdf_text(
+        job["pdf_path"], column_boxes_func
+    )
+    job["extract_seconds"] = time.perf_counter() - start
+    return job
+
+
+def process_invoices(
+    file_names,
+    parse_invoice,
+    column_boxes_func,
+    output_dir_txt,
+    output_dir_json,
+    validation_output_dir,
+    store=None,
+    workers=None,
+    resume=None,
+):
+    """Extract, parse, write and validate every PDF of a vendor script.
+
+    parse_invoice(text) returns the JSON structure for one invoice. With
+    workers (or INVOICE_PIPELINE) the stages overlap: extraction runs in
+    processes, parsing, writing and validation in threads.
+
+    Completed documents are journaled in output_dir_json; with resume
+    (default: --resume on the command line) the journaled ones are skipped.
+    """
+    if workers is None:
+        workers = parse_workers(os.environ.get("INVOICE_PIPELINE", ""))
+    if resume is None:
+        resume = get_resume()
+
+    def new_job(pdf_path):
+        base_filename = os.path.splitext(os.path.basename(pdf_path))[0]
+        return {
+            "pdf_path": pdf_path,
+            "txt_file_path": os.path.join(output_dir_txt, f"{base_filename}.txt"),
+            "json_file_path": os.path.join(output_dir_json, f"{base_filename}.json"),
+        }
+
+    def write_text(job):
+        seconds = job.pop("extract_seconds")
+        if cost_model is not None:
+            cost_model.record(job["pdf_path"], seconds)
+        job["text"] = save_pdf_text(
+            job["txt_file_path"], job.pop("full_text"), job.pop("offset_map"), store
+        )
+        return job
+
+    def parse(job):
+        job["output_data"] = parse_invoice(job.pop("text"))
+        return job
+
+    def write_json(job):
+        save_json_output(job.pop("output_data"), job["json_file_path"], store=store)
+        return job
+
+    def validate(job):
+        validate_if_changed(
+            job["json_file_path"],
+            job["txt_file_path"],
+            validation_output_dir,
+            store=store,
+        )
+        journal.record(job)
+        print("------------------------------------------")
+        return job
+
+    def report(job, e):
+        print(f"Failed to process {job['pdf_path']}: {e}\n")
+
+    # with time budgets or memory limits (INVOICE_DOC_BUDGET, INVOICE_WORKER_RSS_MB,
+    # INVOICE_RECYCLE_DOCS, ...) every extract thread drives its own watched
+    # worker process instead of sharing a process pool
+    extractors = []
+    local = threading.local()
+
+    def extract_watched(job):
+        if not hasattr(local, "extractor"):
+            local.extractor = WatchedExtractor(column_boxes_func)
+            extractors.append(local.extractor)
+        start = time.perf_counter()
+        job["full_text"], job["offset_map"] = local.extractor.extract(job["pdf_path"])
+        job["extract_seconds"] = time.perf_counter() - start
+        return job
+
+    journal = RunJournal(output_dir_json, resume, store)
+    file_names = journal.remaining(file_names)
+
+    # longest job first, so a big statement picked last cannot hold up the run;
+    # needs the whole listing up front
+    cost_model = None
+    if SCHEDULE == "cost":
+        cost_model = CostModel(output_dir_txt)
+        file_names = cost_model.order(file_names)
+
+    jobs = (new_job(pdf_path) for pdf_path in file_names)
+    extract = partial(extract_job, column_boxes_func=column_boxes_func)
+    if DOC_BUDGET or PAGE_BUDGET or MEMORY_BOUNDED:
+        stages = [
+            Stage("extract", extract_watched, workers["extract"] if workers else 1)
+        ]
+    elif workers is None:
+        stages = [Stage("extract", extract)]
+    else:
+        stages = [Stage("extract", extract, workers["extract"], processes=True)]
+    for name, func, kind in (
+        ("write_text", write_text, "write"),
+        ("parse", parse, "parse"),
+        ("write_json", write_json, "write"),
+        ("validate", validate, "validate"),
+    ):
+        stages.append(Stage(name, func, workers[kind] if workers else 1))
+
+    try:
+        if workers is None:
+            return run_inline(jobs, stages, report)
+        return run_pipeline(jobs, stages, on_error=report)
+    finally:
+        for extractor in extractors:
+            extractor.close()
+        journal.close()
@@ -0,0 +1,356 @@
+import os
+import re
+import sys
+import jsoncodec
+import sqlite3
+import threading
+from datetime import datetime
+from ndjsonsink import NdjsonSink
+from writebehind import WriteBehindWriter
+
+DEFAULT_DB_PATH = "validation_results.db"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    started_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS validation_results (
+    id INTEGER PRIMARY KEY,
+    run_id INTEGER NOT NULL REFERENCES runs(id),
+    vendor TEXT NOT NULL,
+    document TEXT NOT NULL,
+    field_path TEXT NOT NULL,
+    full_key TEXT NOT NULL,
+    value TEXT,
+    text_index INTEGER NOT NULL,
+    distance INTEGER NOT NULL DEFAULT 0,
+    page INTEGER,
+    status TEXT NOT NULL,
+    validated_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_results_vendor ON validation_results(vendor);
+CREATE INDEX IF NOT EXISTS idx_results_field_path ON validation_results(field_path);
+CREATE INDEX IF NOT EXISTS idx_results_status ON validation_results(status);
+CREATE INDEX IF NOT EXISTS idx_results_vendor_status_time
+    ON validation_results(vendor, status, validated_at);
+CREATE INDEX IF NOT EXISTS idx_results_document
+    ON validation_results(vendor, document, run_id, validated_at);
+"""
+
+
+# "line_items[3].Amount" -> "line_items[].Amount", so misses group per field
+def generic_field_path(full_key):
+    return re.sub(r"\[\d+\]", "[]", full_key)
+
+
+def result_status(idx, distance):
+    if idx == -1:
+        return "missing"
+    return "fuzzy" if distance else "found"
+
+
+class ResultStore:
+    """SQLite store for validation outcomes.
+
+    Rows are buffered in memory and written in a single transaction per
+    run when the store is flushed or closed (or every batch_size rows, to
+    keep long runs bounded). Safe to share between pipeline threads.
+    """
+
+    # text / json / validation files are still written by utils
+    replaces_files = False
+    # optional NdjsonSink taking the JSON outputs instead of per-invoice files
+    json_sink = None
+    # optional WriteBehindWriter doing the file writes on a background thread
+    writer = None
+
+    def __init__(self, db_path=DEFAULT_DB_PATH, batch_size=50000):
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.executescript(SCHEMA)
+        self.lock = threading.RLock()
+        self.run_id = None  # created with the first result of this run
+        self.pending = []
+
+    def start_run(self):
+        with self.conn:
+            cur = self.conn.execute(
+                "INSERT INTO runs (started_at) VALUES (?)",
+                (datetime.now().isoformat(timespec="seconds"),),
+            )
+        self.run_id = cur.lastrowid
+
+    def add_validation(self, vendor, document, records):
+        with self.lock:
+            self._add_validation(vendor, document, records)
+
+    def _add_validation(self, vendor, document, records):
+        if self.run_id is None:
+            self.start_run()
+        # with the run id this tells one validation of a document from another
+        validated_at = datetime.now().isoformat(timespec="microseconds")
+        for full_key, value, idx, distance, page in records:
+            self.pending.append(
+                (
+                    self.run_id,
+                    vendor,
+                    document,
+                    generic_field_path(full_key),
+                    full_key,
+                    value,
+                    idx,
+                    distance or 0,
+                    page,
+                    result_status(idx, distance),
+                    validated_at,
+                )
+            )
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        with self.lock:
+            if not self.pending:
+                return
+            with self.conn:
+                self.write_pending()
+
+    def write_pending(self):
+        self.conn.executemany(
+            "INSERT INTO validation_results (run_id, vendor, document,"
+            " field_path, full_key, value, text_index, distance, page,"
+            " status, validated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            self.pending,
+        )
+        self.pending = []
+
+    def close(self):
+        with self.lock:
+            self.flush()
+            self.conn.close()
+        if self.json_sink is not None:
+            self.json_sink.close()
+        if self.writer is not None:
+            self.writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def top_missing_fields(self, vendor=None, since=None, limit=20):
+        """Fields that miss most often, e.g. for one vendor since a date.
+
+        Only the latest validation of each document counts, so a document
+        validated again (by a rerun or revalidate.py) is counted once, and
+        fields that validation no longer has (e.g. line items that are
+        gone) are not counted at all.
+        """
+        # (run_id, validated_at) of the newest row identifies the validation
+        latest = (
+            "SELECT vendor, document, run_id, validated_at FROM validation_results"
+            " WHERE id IN (SELECT MAX(id) FROM validation_results"
+            + (" WHERE vendor = ?" if vendor else "")
+            + " GROUP BY vendor, document)"
+        )
+        query = (
+            f"WITH latest AS ({latest})"
+            " SELECT field_path, COUNT(*) AS misses,"
+            " COUNT(DISTINCT document) AS documents"
+            " FROM validation_results JOIN latest"
+            " USING (vendor, document, run_id, validated_at)"
+            " WHERE status = 'missing'"
+        )
+        params = [vendor] if vendor else []
+        if since:
+            query += " AND validated_at >= ?"
+            params.append(since)
+        query += " GROUP BY field_path ORDER BY misses DESC LIMIT ?"
+        params.append(limit)
+        return self.conn.execute(query, params).fetchall()
+
+
+DOCUMENT_SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    vendor TEXT NOT NULL,
+    document TEXT NOT NULL,
+    txt_path TEXT,
+    json_path TEXT,
+    validation_path TEXT,
+    text TEXT,
+    offset_map TEXT,
+    data TEXT,
+    validation_report TEXT,
+    json_hash TEXT,
+    txt_hash TEXT,
+    fuzzy INTEGER,
+    updated_at TEXT NOT NULL,
+    PRIMARY KEY (vendor, document)
+);
+"""
+
+DOCUMENT_COLUMNS = [
+    "txt_path",
+    "json_path",
+    "validation_path",
+    "text",
+    "offset_map",
+    "data",
+    "validation_report",
+    "json_hash",
+    "txt_hash",
+    "fuzzy",
+]
+
+
+class OutputStore(ResultStore):
+    """One SQLite database for extracted text, parsed JSON and validation.
+
+    Replaces the per-invoice files in *txtfile, *jsonfile and
+    *validatejsontext. The database runs in WAL mode; documents and
+    validation rows are buffered and written together, one transaction
+    per batch_documents documents. export() regenerates the file layout.
+    """
+
+    replaces_files = True
+
+    def __init__(self, db_path=DEFAULT_DB_PATH, batch_size=50000, batch_documents=200):
+        super().__init__(db_path, batch_size)
+        self.batch_documents = batch_documents
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(DOCUMENT_SCHEMA)
+        self.pending_documents = {}
+
+    def add_document(self, vendor, document, **fields):
+        if "offset_map" in fields and fields["offset_map"] is not None:
+            fields["offset_map"] = jsoncodec.dumps(
+                fields["offset_map"], compact=True
+            ).decode("utf-8")
+        key = (vendor, document)
+        with self.lock:
+            if key not in self.pending_documents and (
+                len(self.pending_documents) >= self.batch_documents
+            ):
+                self.flush()
+            self.pending_documents.setdefault(key, {}).update(fields)
+
+    def get_document(self, vendor, document):
+        with self.lock:
+            row = self.conn.execute(
+                f"SELECT {', '.join(DOCUMENT_COLUMNS)} FROM documents"
+                " WHERE vendor = ? AND document = ?",
+                (vendor, document),
+            ).fetchone()
+            pending = dict(self.pending_documents.get((vendor, document), {}))
+        fields = dict(zip(DOCUMENT_COLUMNS, row or [None] * len(DOCUMENT_COLUMNS)))
+        fields.update(pending)
+        if fields["offset_map"] is not None:
+            fields["offset_map"] = jsoncodec.loads(fields["offset_map"])
+        return fields
+
+    def flush(self):
+        with self.lock:
+            self.write_documents()
+
+    def write_documents(self):
+        if not self.pending and not self.pending_documents:
+            return
+        updated_at = datetime.now().isoformat(timespec="seconds")
+        rows = [
+            (vendor, document, updated_at)
+            + tuple(fields.get(column) for column in DOCUMENT_COLUMNS)
+            for (vendor, document), fields in self.pending_documents.items()
+        ]
+        # only the columns given for a document overwrite the stored ones
+        updates = ", ".join(
+            f"{column} = COALESCE(excluded.{column}, {column})"
+            for column in DOCUMENT_COLUMNS
+        )
+        with self.conn:
+            self.conn.executemany(
+                f"INSERT INTO documents (vendor, document, updated_at,"
+                f" {', '.join(DOCUMENT_COLUMNS)})"
+                f" VALUES ({', '.join('?' * (3 + len(DOCUMENT_COLUMNS)))})"
+                f" ON CONFLICT (vendor, document) DO UPDATE SET"
+                f" updated_at = excluded.updated_at, {updates}",
+                rows,
+            )
+            self.write_pending()
+        self.pending_documents = {}
+
+    def iter_json(self, json_dirs=None):
+        """(json_path, data) of every stored document, or of those in json_dirs."""
+        self.flush()
+        dirs = json_dirs and {os.path.normpath(d) for d in json_dirs}
+        cursor = self.conn.execute(
+            "SELECT json_path, data FROM documents"
+            " WHERE json_path IS NOT NULL AND data IS NOT NULL ORDER BY json_path"
+        )
+        for json_path, data in cursor.fetchall():
+            if dirs and os.path.normpath(os.path.dirname(json_path)) not in dirs:
+                continue
+            yield json_path, jsoncodec.loads(data)
+
+    def export(self, root="."):
+        """Write the stored documents back out as the per-file layout."""
+        from utils import get_offset_map_path
+
+        self.flush()
+        written = 0
+        cursor = self.conn.execute(
+            "SELECT txt_path, text, offset_map, json_path, data,"
+            " validation_path, validation_report FROM documents"
+        )
+        for row in cursor:
+            txt_path, text, offset_map, json_path, data, validation_path, report = row
+            for path, content in (
+                (txt_path, text),
+                (txt_path and get_offset_map_path(txt_path), offset_map),
+                (json_path, data),
+                (validation_path, report),
+            ):
+                if not path or content is None:
+                    continue
+                path = os.path.join(root, path)
+                os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+                with open(path, "w", encoding="utf-8") as f:
+                    f.write(content)
+                written += 1
+        return written
+
+
+# INVOICE_OUTPUT_BACKEND=sqlite keeps all outputs in the database instead of files,
+# INVOICE_OUTPUT_BACKEND=ndjson appends the JSON outputs to one file per run;
+# INVOICE_WRITE_BEHIND=1 moves the output file writes to a background thread
+def open_output_store(db_path=DEFAULT_DB_PATH):
+    backend = os.environ.get("INVOICE_OUTPUT_BACKEND", "files")
+    if backend == "sqlite":
+        return OutputStore(db_path)
+    store = ResultStore(db_path)
+    if backend == "ndjson":
+        store.json_sink = NdjsonSink()
+    if os.environ.get("INVOICE_WRITE_BEHIND", "") not in ("", "0"):
+        store.writer = WriteBehindWriter()
+    return store
+
+
+if __name__ == "__main__":
+    # python resultstore.py [vendor] [since]   most frequently missing fields
+    #   e.g. python resultstore.py Vaco 2026-10-01
+    # python resultstore.py export [root]      regenerate the per-file layout
+    if len(sys.argv) > 1 and sys.argv[1] == "export":
+        root = sys.argv[2] if len(sys.argv) > 2 else "."
+        with OutputStore() as store:
+            print(f"{store.export(root)} files written under {root}")
+        sys.exit(0)
+
+    vendor = sys.argv[1] if len(sys.argv) > 1 else None
+    since = sys.argv[2] if len(sys.argv) > 2 else None
+
+    with ResultStore() as store:
+        for field_path, misses, documents in store.top_missing_fields(vendor, since):
+            print(f"{misses:6d}  {documents:5d} docs  {field_path}")
@@ -0,0 +1,49 @@
+import os
+import sys
+import jsoncodec
+from ndjsonsink import latest_json_outputs
+from resultstore import ResultStore
+from textcache import find_text_file
+from utils import get_vendor_output_dirs, validate_if_changed
+
+# Re-run validation only for json/text pairs whose hashes changed.
+#   python revalidate.py [--fuzzy] [vendor ...]   e.g. python revalidate.py Vaco LPL
+# Outputs of the ndjson backend are read from the run files, the newest record
+# of each document.
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    fuzzy = "--fuzzy" in args
+    vendors = {v.lower() for v in args if v != "--fuzzy"}
+    checked = revalidated = 0
+    results_store = ResultStore()
+
+    for vendor, txt_dir, json_dir, validation_dir in get_vendor_output_dirs():
+        if vendors and vendor.lower() not in vendors:
+            continue
+        os.makedirs(validation_dir, exist_ok=True)
+
+        latest = latest_json_outputs(json_dir)
+        for base_name in sorted(latest):
+            json_path, data = latest[base_name]
+            txt_path = os.path.join(txt_dir, f"{base_name}.txt")
+            if find_text_file(txt_path) is None:
+                print(f"Missing text file for {base_name}, skipped")
+                continue
+            checked += 1
+            records = validate_if_changed(
+                json_path or os.path.join(json_dir, f"{base_name}.json"),
+                txt_path,
+                validation_dir,
+                fuzzy=fuzzy,
+                store=results_store,
+                serialized=(
+                    None if data is None else jsoncodec.dumps(data, compact=True)
+                ),
+            )
+            if records is not None:
+                revalidated += 1
+
+    results_store.close()
+    print(f"\n{revalidated} of {checked} invoices revalidated")
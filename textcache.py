@@ -0,0 +1,164 @@
+import os
+import sys
+import glob
+import gzip
+
+# zstd with per-vendor dictionaries when available, gzip otherwise
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# "", "gzip" or "zstd"; unset keeps plain .txt files
+TEXT_COMPRESSION = os.environ.get("INVOICE_TEXT_COMPRESSION", "")
+
+SUFFIXES = {"zstd": ".zst", "gzip": ".gz"}
+DICT_PREFIX = ".zstd-dict-"
+DICT_SIZE = 16 * 1024
+ZSTD_LEVEL = 19
+
+_dict_cache = {}
+
+
+def get_compression(compression=None):
+    compression = TEXT_COMPRESSION if compression is None else compression
+    if compression == "zstd" and zstandard is None:
+        return "gzip"
+    return compression
+
+
+# "inv.txt.zst" -> "inv.txt"
+def logical_path(path):
+    for suffix in SUFFIXES.values():
+        if path.endswith(suffix):
+            return path[: -len(suffix)]
+    return path
+
+
+# Files a logical .txt path may be stored as, in lookup order
+def text_file_candidates(txt_path):
+    return [txt_path, txt_path + ".zst", txt_path + ".gz"]
+
+
+# Actual file behind a logical .txt path: plain, .zst or .gz
+def find_text_file(txt_path):
+    for path in text_file_candidates(txt_path):
+        if os.path.isfile(path):
+            return path
+    return None
+
+
+def load_dictionary(text_dir, dict_id=None):
+    """Dictionary with dict_id from text_dir, or the newest one if None."""
+    if dict_id is None:
+        paths = glob.glob(os.path.join(text_dir, DICT_PREFIX + "*"))
+        if not paths:
+            return None
+        path = max(paths, key=os.path.getmtime)
+    else:
+        path = os.path.join(text_dir, f"{DICT_PREFIX}{dict_id}")
+    if path not in _dict_cache:
+        with open(path, "rb") as f:
+            _dict_cache[path] = zstandard.ZstdCompressionDict(f.read())
+    return _dict_cache[path]
+
+
+# (path, bytes) to store text under, compressed as configured
+def encode_text(txt_path, text, compression=None):
+    compression = get_compression(compression)
+    data = text.encode("utf-8")
+    if compression == "zstd":
+        dictionary = load_dictionary(os.path.dirname(txt_path) or ".")
+        compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL, dict_data=dictionary)
+        data = compressor.compress(data)
+    elif compression == "gzip":
+        data = gzip.compress(data, mtime=0)  # mtime=0 keeps the bytes stable
+    return txt_path + SUFFIXES.get(compression, ""), data
+
+
+def decode_text(path, data):
+    if path.endswith(".zst"):
+        if zstandard is None:
+            raise RuntimeError(f"zstandard is needed to read {path}")
+        dict_id = zstandard.get_frame_parameters(data).dict_id
+        dictionary = None
+        if dict_id:
+            dictionary = load_dictionary(os.path.dirname(path) or ".", dict_id)
+        data = zstandard.ZstdDecompressor(dict_data=dictionary).decompress(data)
+    elif path.endswith(".gz"):
+        data = gzip.decompress(data)
+
+    # same newline handling as reading a text-mode file
+    return data.decode("utf-8").replace("\r\n", "\n").replace("\r", "\n")
+
+
+def write_text(txt_path, text, compression=None):
+    path, data = encode_text(txt_path, text, compression)
+    with open(path, "wb") as f:
+        f.write(data)
+
+    # drop the copy in any other format so reads are unambiguous
+    for stale in text_file_candidates(txt_path):
+        if stale != path and os.path.isfile(stale):
+            os.remove(stale)
+    return path
+
+
+def read_text(txt_path):
+    path = find_text_file(txt_path)
+    if path is None:
+        raise FileNotFoundError(txt_path)
+    with open(path, "rb") as f:
+        return decode_text(path, f.read())
+
+
+def train_dictionary(text_dir):
+    """Train a zstd dictionary on the extracted texts of one vendor.
+
+    Dictionaries are named by their id, so texts compressed with an older
+    dictionary stay readable after retraining.
+    """
+    samples = []
+    for path in sorted(glob.glob(os.path.join(text_dir, "*.txt*"))):
+        samples.append(read_text(logical_path(path)).encode("utf-8"))
+    if len(samples) < 2:
+        return None
+    try:
+        dictionary = zstandard.train_dictionary(DICT_SIZE, samples)
+    except zstandard.ZstdError as e:
+        print(f"Dictionary training failed for {text_dir}: {e}")
+        return None
+    with open(
+        os.path.join(text_dir, f"{DICT_PREFIX}{dictionary.dict_id()}"), "wb"
+    ) as f:
+        f.write(dictionary.as_bytes())
+    return dictionary.dict_id()
+
+
+def compress_dir(text_dir, compression=None):
+    paths = sorted(glob.glob(os.path.join(text_dir, "*.txt*")))
+    logical = sorted({logical_path(path) for path in paths})
+    before = sum(os.path.getsize(path) for path in paths)
+    after = 0
+    for txt_path in logical:
+        after += os.path.getsize(write_text(txt_path, read_text(txt_path), compression))
+    return len(logical), before, after
+
+
+if __name__ == "__main__":
+    # python textcache.py train <txt_dir> ...           train zstd dictionaries
+    # python textcache.py compress <zstd|gzip|none> <txt_dir> ...
+    command = sys.argv[1] if len(sys.argv) > 1 else ""
+    if command == "train":
+        if zstandard is None:
+            sys.exit("zstandard is not installed, nothing to train")
+        for text_dir in sys.argv[2:]:
+            print(f"{text_dir}: dictionary {train_dictionary(text_dir)}")
+    elif command == "compress" and len(sys.argv) > 2:
+        compression = "" if sys.argv[2] == "none" else sys.argv[2]
+        for text_dir in sys.argv[3:]:
+            count, before, after = compress_dir(text_dir, compression)
+            print(f"{text_dir}: {count} files, {before} -> {after} bytes")
+    else:
+        print("usage: python textcache.py train <txt_dir> ...")
+        print("       python textcache.py compress <zstd|gzip|none> <txt_dir> ...")
@@ -0,0 +1,332 @@
+import gc
+import os
+import time
+import threading
+import multiprocessing
+from functools import partial
+from concurrent.futures import Future, ProcessPoolExecutor
+from pdfsource import open_pdf, release_pdf_memory, source_name
+from utils import extract_pdf_text
+
+# Seconds a document / a single page may take in column-box extraction before
+# it is abandoned for plain page text; 0 (the default) means no budget
+DOC_BUDGET = float(os.environ.get("INVOICE_DOC_BUDGET", "0"))
+PAGE_BUDGET = float(os.environ.get("INVOICE_PAGE_BUDGET", "0"))
+
+# Memory-bounded mode: a worker is killed once its RSS passes WORKER_RSS_MB
+# during a document, and replaced after RECYCLE_DOCS documents or when a
+# document leaves it at RECYCLE_RSS_MB or more; 0 means no limit
+WORKER_RSS_MB = float(os.environ.get("INVOICE_WORKER_RSS_MB", "0"))
+RECYCLE_DOCS = int(os.environ.get("INVOICE_RECYCLE_DOCS", "0"))
+RECYCLE_RSS_MB = float(os.environ.get("INVOICE_RECYCLE_RSS_MB", "0"))
+MEMORY_BOUNDED = bool(WORKER_RSS_MB or RECYCLE_DOCS or RECYCLE_RSS_MB)
+RSS_POLL_INTERVAL = 0.05
+
+
+class BudgetExceeded(Exception):
+    pass
+
+
+class MemoryLimitExceeded(BudgetExceeded):
+    pass
+
+
+# Resident set size of a process in MB, from /proc; None where that is missing
+def process_rss_mb(pid):
+    try:
+        with open(f"/proc/{pid}/statm", "rb") as f:
+            pages = int(f.read().split()[1])
+    except (OSError, IndexError, ValueError):
+        return None
+    return pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+
+
+# The RSS limits are refused, not silently ignored, where it cannot be sampled
+def check_rss_limits(*limits_mb):
+    if any(limits_mb) and process_rss_mb(os.getpid()) is None:
+        raise ValueError(
+            "INVOICE_WORKER_RSS_MB and INVOICE_RECYCLE_RSS_MB need /proc to"
+            " sample the RSS, which this platform does not have"
+        )
+
+
+# Fallback extraction: whole-page text in reading order, one map entry per page
+def extract_plain_text(pdf_path, on_page=None):
+    print(f"Processing (plain text): {source_name(pdf_path)}")
+    full_text = ""
+    offset_map = {"offsets": [], "pages": [], "rects": []}
+    with open_pdf(pdf_path) as doc:
+        for page in doc:
+            if on_page is not None:
+                on_page(page.number)
+            offset_map["offsets"].append(len(full_text))
+            offset_map["pages"].append(page.number + 1)
+            offset_map["rects"].append(list(page.rect.irect))
+            full_text += page.get_text(sort=True) + "\n\n"
+    return full_text, offset_map
+
+
+def _worker_main(conn, column_boxes_func, release_memory=False):
+    while True:
+        try:
+            request = conn.recv()
+        except EOFError:
+            return
+        if request is None:
+            return
+        mode, pdf_path = request
+
+        def on_page(number):
+            conn.send(("page", number))
+
+        try:
+            if mode == "columns":
+                result = extract_pdf_text(pdf_path, column_boxes_func, on_page=on_page)
+            else:
+                result = extract_plain_text(pdf_path, on_page=on_page)
+        except Exception as e:
+            result = None
+            message = ("error", f"{type(e).__name__}: {e}")
+        else:
+            message = ("done", result)
+        if release_memory:
+            # the document is closed already; free what it left cached
+            del result
+            gc.collect()
+            release_pdf_memory()
+        conn.send(message)
+
+
+class WatchedExtractor:
+    """Text extraction in a child process, under per-document and per-page
+    time budgets.
+
+    The worker reports each page it starts on; the calling thread waits on
+    those reports and kills the worker once a budget runs out (a page stuck
+    in column_boxes or inside MuPDF cannot be interrupted any other way).
+    The document is then extracted again with plain page.get_text(sort=True)
+    in a fresh worker, under the same budgets. One extractor serves one
+    thread at a time.
+
+    With max_rss_mb the worker's RSS is sampled while it works and the
+    worker is killed like on a timeout when it passes the limit. With
+    recycle_docs / recycle_rss_mb it is replaced between documents, after
+    that many documents or once it stays at that size; the worker then also
+    empties MuPDF's store after every document.
+    """
+
+    def __init__(
+        self,
+        column_boxes_func,
+        doc_budget=DOC_BUDGET,
+        page_budget=PAGE_BUDGET,
+        max_rss_mb=WORKER_RSS_MB,
+        recycle_docs=RECYCLE_DOCS,
+        recycle_rss_mb=RECYCLE_RSS_MB,
+    ):
+        check_rss_limits(max_rss_mb, recycle_rss_mb)
+        self.column_boxes_func = column_boxes_func
+        self.doc_budget = doc_budget
+        self.page_budget = page_budget
+        self.max_rss_mb = max_rss_mb
+        self.recycle_docs = recycle_docs
+        self.recycle_rss_mb = recycle_rss_mb
+        self.process = None
+        self.conn = None
+        self.documents = 0  # done by the current worker
+
+    def start(self):
+        self.conn, child_conn = multiprocessing.Pipe()
+        release_memory = bool(
+            self.max_rss_mb or self.recycle_docs or self.recycle_rss_mb
+        )
+        self.process = multiprocessing.Process(
+            target=_worker_main,
+            args=(child_conn, self.column_boxes_func, release_memory),
+            daemon=True,
+        )
+        self.process.start()
+        child_conn.close()
+        self.documents = 0
+
+    def kill(self):
+        self.process.kill()
+        self.process.join()
+        self.conn.close()
+        self.process = None
+
+    def run(self, mode, pdf_path):
+        if self.process is None:
+            self.start()
+        self.conn.send((mode, pdf_path))
+
+        now = time.monotonic()
+        doc_deadline = now + self.doc_budget if self.doc_budget else None
+        # opening the document, before the first page message, is on the
+        # page budget too
+        page_deadline = now + self.page_budget if self.page_budget else None
+        page = None
+        while True:
+            deadlines = [d for d in (doc_deadline, page_deadline) if d is not None]
+            timeout = max(0, min(deadlines) - time.monotonic()) if deadlines else None
+            if self.max_rss_mb:
+                timeout = (
+                    min(timeout, RSS_POLL_INTERVAL) if deadlines else RSS_POLL_INTERVAL
+                )
+                rss = process_rss_mb(self.process.pid)
+                if rss is not None and rss > self.max_rss_mb:
+                    self.kill()
+                    raise MemoryLimitExceeded(
+                        f"worker at {rss:.0f} MB, over {self.max_rss_mb:g} MB"
+                    )
+            if not self.conn.poll(timeout):
+                now = time.monotonic()
+                if page_deadline is not None and page_deadline <= now:
+                    self.kill()
+                    where = "opening" if page is None else f"page {page + 1}"
+                    raise BudgetExceeded(f"{where} over {self.page_budget}s")
+                if doc_deadline is not None and doc_deadline <= now:
+                    self.kill()
+                    raise BudgetExceeded(f"document over {self.doc_budget}s")
+                continue  # only woken up to sample the RSS
+            try:
+                kind, value = self.conn.recv()
+            except EOFError:
+                self.kill()
+                raise RuntimeError("extraction worker died") from None
+            if kind == "page":
+                page = value
+                if self.page_budget:
+                    page_deadline = time.monotonic() + self.page_budget
+            elif kind == "done":
+                self.documents += 1
+                self.recycle_if_needed()
+                return value
+            else:
+                raise RuntimeError(value)
+
+    # Replace the worker before its next document once it has done enough
+    def recycle_if_needed(self):
+        reason = None
+        if self.recycle_docs and self.documents >= self.recycle_docs:
+            reason = f"{self.documents} documents"
+        elif self.recycle_rss_mb:
+            rss = process_rss_mb(self.process.pid)
+            if rss is not None and rss >= self.recycle_rss_mb:
+                reason = f"{rss:.0f} MB"
+        if reason is not None:
+            print(f"Recycling extraction worker after {reason}")
+            self.close()
+
+    def extract(self, pdf_path):
+        """(full_text, offset_map) of a PDF, like utils.extract_pdf_text."""
+        try:
+            return self.run("columns", pdf_path)
+        except BudgetExceeded as e:
+            print(
+                f"Limit exceeded for {source_name(pdf_path)} ({e}),"
+                " falling back to plain page text"
+            )
+        return self.run("plain", pdf_path)
+
+    def close(self):
+        if self.process is None:
+            return
+        self.conn.send(None)
+        self.process.join(5)
+        if self.process.is_alive():
+            self.process.kill()
+        self.conn.close()
+        self.process = None
+
+
+# Documents extracted by this pool worker process so far
+_worker_documents = 0
+
+
+# Runs func(*args) in a pool worker, then reports how many documents the worker
+# has done and its RSS, for RecyclingPool to decide on replacing it
+def _counted_task(func, documents, *args):
+    global _worker_documents
+    result = func(*args)
+    _worker_documents += documents
+    if MEMORY_BOUNDED:
+        gc.collect()
+        release_pdf_memory()
+    return result, _worker_documents, process_rss_mb(os.getpid())
+
+
+class RecyclingPool:
+    """Process pool whose workers are replaced after recycle_docs documents
+    or once a task leaves one at recycle_rss_mb or more.
+
+    Workers count the documents of their tasks themselves (a task may
+    carry several), since max_tasks_per_child counts tasks. A pool worker
+    cannot be retired on its own, so the whole pool is: the next tasks go
+    to a fresh pool and the old one finishes what it was given. The
+    per-document max_rss_mb limit needs a watched worker per document
+    (WatchedExtractor) and is refused here.
+    """
+
+    def __init__(
+        self,
+        workers=None,
+        initializer=None,
+        max_rss_mb=WORKER_RSS_MB,
+        recycle_docs=RECYCLE_DOCS,
+        recycle_rss_mb=RECYCLE_RSS_MB,
+    ):
+        if max_rss_mb:
+            raise ValueError(
+                "INVOICE_WORKER_RSS_MB is only supported by the batch scripts;"
+                " use INVOICE_RECYCLE_RSS_MB with a pool"
+            )
+        check_rss_limits(recycle_rss_mb)
+        self.workers = workers or os.cpu_count() or 1
+        self.initializer = initializer
+        self.recycle_docs = recycle_docs
+        self.recycle_rss_mb = recycle_rss_mb
+        self.lock = threading.Lock()
+        self.pool = self.new_pool()
+        # start the workers now rather than on the first job
+        for future in [self.pool.submit(os.getpid) for _ in range(self.workers)]:
+            future.result()
+
+    def new_pool(self):
+        return ProcessPoolExecutor(self.workers, initializer=self.initializer)
+
+    # Future for func(*args); documents is how many documents the task extracts
+    def submit(self, func, *args, documents=1):
+        with self.lock:
+            pool = self.pool
+            task = pool.submit(_counted_task, func, documents, *args)
+        future = Future()
+        task.add_done_callback(partial(self.task_done, pool, future))
+        return future
+
+    def task_done(self, pool, future, task):
+        try:
+            result, documents, rss = task.result()
+        except Exception as e:
+            future.set_exception(e)
+            return
+        reason = None
+        if self.recycle_docs and documents >= self.recycle_docs:
+            reason = f"{documents} documents"
+        elif self.recycle_rss_mb and rss is not None and rss >= self.recycle_rss_mb:
+            reason = f"{rss:.0f} MB"
+        if reason is not None:
+            self.recycle(pool, reason)
+        future.set_result(result)
+
+    def recycle(self, pool, reason):
+        with self.lock:
+            if pool is not self.pool:
+                return  # replaced already
+            print(f"Recycling extraction workers after {reason}")
+            self.pool = self.new_pool()
+        pool.shutdown(wait=False)  # its workers exit after their last task
+
+    def shutdown(self):
+        with self.lock:
+            self.pool.shutdown()
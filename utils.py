@@ -1,7 +1,19 @@
 import re
 import os
-import json
+import sys
+import bisect
+import fnmatch
+import hashlib
+import tarfile
+import zipfile
 import fitz  # PyMuPDF
+import jsoncodec
+from fuzzymatch import QGramIndex
+from ndjsonsink import read_ndjson
+from pdfsource import ARCHIVE_PATTERNS, ArchiveMember, is_archive, iter_archive
+from pdfsource import open_pdf, source_name
+from textcache import decode_text, encode_text, find_text_file, text_file_candidates
+from writebehind import atomic_write
 
 
 def read_line_and_next_if_found(filename, search_text):
@@ -29,60 +41,390 @@ def extract(pattern, source, default=""):
 
 
 # Input file path
-def get_pdf_files(input_dir, prefix, extension=".pdf"):
-
-    return [
-        os.path.join(input_dir, item)
-        for item in os.listdir(input_dir)
-        if os.path.isfile(os.path.join(input_dir, item))
-        and item.lower().startswith(prefix.lower())
-        and item.lower().endswith(extension.lower())
-    ]
+def scan_files(root, include=("*",), exclude=(), recursive=True):
+    """Walk root lazily with os.scandir, yielding (path, stat) per file.
+
+    A file is taken when its name or its path relative to root matches one
+    of the include globs and none of the exclude globs; directories that
+    match an exclude glob are not entered. Globs are matched
+    case-insensitively, so "*.pdf" also takes "IRILLIC_03.PDF". Entries
+    are yielded in name order, files of a directory before its subfolders.
+    """
+    include = [pattern.lower() for pattern in include]
+    exclude = [pattern.lower() for pattern in exclude]
+
+    def matches(patterns, name, rel_path):
+        return any(
+            fnmatch.fnmatchcase(name, pattern) or fnmatch.fnmatchcase(rel_path, pattern)
+            for pattern in patterns
+        )
+
+    pending_dirs = [""]
+    while pending_dirs:
+        rel_dir = pending_dirs.pop()
+        dir_path = os.path.join(root, rel_dir) if rel_dir else root
+        try:
+            with os.scandir(dir_path) as it:
+                entries = sorted(it, key=lambda entry: entry.name)
+        except OSError as e:
+            print(f"Cannot list {dir_path}: {e}")
+            continue
+
+        subdirs = []
+        for entry in entries:
+            rel_path = f"{rel_dir}/{entry.name}" if rel_dir else entry.name
+            name, rel_lower = entry.name.lower(), rel_path.lower()
+            if matches(exclude, name, rel_lower):
+                continue
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    if recursive:
+                        subdirs.append(rel_path)
+                elif entry.is_file() and matches(include, name, rel_lower):
+                    yield entry.path, entry.stat()
+            except OSError as e:
+                print(f"Cannot stat {entry.path}: {e}")
+        pending_dirs.extend(reversed(subdirs))
+
+
+# Whether a file belongs to the vendor with file_prefix: its name or its path
+# relative to the input folder matches "<prefix>*<extension>", in any case, so
+# "3de" takes "3de_08.pdf" and "3DE/3DIV20-210183.pdf"
+def matches_prefix(rel_path, prefix, extension=".pdf"):
+    rel_path = rel_path.replace(os.sep, "/").lower()
+    pattern = f"{prefix}*{extension}".lower()
+    name = rel_path.rsplit("/", 1)[-1]
+    return fnmatch.fnmatchcase(name, pattern) or fnmatch.fnmatchcase(rel_path, pattern)
+
+
+# An archive whose name or relative path starts with prefix belongs to the
+# vendor whole; in any other archive members are matched by their own name
+def archive_member_matches(archive_rel_path, member_name, prefix, extension=".pdf"):
+    if matches_prefix(archive_rel_path, prefix, extension=""):
+        prefix = ""
+    return matches_prefix(member_name, prefix, extension)
+
+
+# PDFs under input_dir (subfolders included) that match prefix as above, e.g.
+# "3de" takes 3de_*.pdf and everything in 3DE/ and 3de_sep/. Zip/tar archives
+# are read in place, their members yielded as ArchiveMember keys
+def get_pdf_files(input_dir, prefix, extension=".pdf", exclude=(), archives=True):
+    include = [f"{prefix}*{extension}"] + (list(ARCHIVE_PATTERNS) if archives else [])
+    for path, _ in scan_files(input_dir, include, exclude):
+        if not (archives and is_archive(path)):
+            yield path
+            continue
+        rel_path = os.path.relpath(path, input_dir)
+
+        def match(member_name):
+            return archive_member_matches(rel_path, member_name, prefix, extension)
+
+        try:
+            yield from iter_archive(path, match)
+        except (OSError, tarfile.TarError, zipfile.BadZipFile) as e:
+            print(f"Cannot read archive {path}: {e}")
+
+
+# byte-identical inputs: later copies are recorded here as aliases of the first
+ALIAS_MANIFEST = ".aliases"
+_alias_cache = {}
+
+
+def load_aliases(output_dir):
+    if output_dir in _alias_cache:
+        return _alias_cache[output_dir]
+    aliases = {}
+    alias_path = os.path.join(output_dir, ALIAS_MANIFEST)
+    if os.path.isfile(alias_path):
+        for entry in read_ndjson(alias_path):
+            aliases[entry["name"]] = entry["canonical"]
+    _alias_cache[output_dir] = aliases
+    return aliases
+
+
+# Base name of a source's outputs: "allinvoices/3DE/x_08.pdf" -> "x_08"
+def output_name(path):
+    return os.path.splitext(os.path.basename(path))[0]
+
+
+def record_alias(output_dir, path, canonical_path):
+    name = output_name(path)
+    canonical = output_name(canonical_path)
+    aliases = load_aliases(output_dir)
+    # same file name in another folder shares the canonical outputs already
+    if name == canonical or aliases.get(name) == canonical:
+        return
+    aliases[name] = canonical
+    entry = {"name": name, "canonical": canonical, "path": path}
+    with open(os.path.join(output_dir, ALIAS_MANIFEST), "ab") as f:
+        f.write(jsoncodec.dumps(entry, compact=True) + b"\n")
+
+
+def skip_duplicates(paths, output_dir=None):
+    """Yield the paths whose content has not been seen earlier in the run.
+
+    A file is only hashed (in chunks) once another file of the same size
+    turns up, so unique inputs cost one stat. Each duplicate is printed
+    and, with output_dir, recorded in its alias manifest, so its result
+    is the canonical document's output.
+
+    Outputs are named after the file name alone, so a different invoice
+    with the same name in another folder would overwrite the first one's
+    outputs; such name clashes are reported and only the first is yielded.
+    """
+    by_size = {}  # size -> canonical paths of that size
+    hashes = {}
+    names = {}  # output name -> path yielded with it
+    for path in paths:
+        if isinstance(path, ArchiveMember):
+            # already in memory; keep only the key so the bytes can be freed
+            size = len(path.data)
+            hashes[str(path)] = hashlib.sha256(path.data).hexdigest()
+        else:
+            size = os.path.getsize(path)
+        canonical = None
+        for seen in by_size.get(size, ()):
+            for p in (seen, path):
+                if p not in hashes:
+                    hashes[p] = file_hash(p)
+            if hashes[seen] == hashes[path]:
+                canonical = seen
+                break
+
+        if canonical is None:
+            name = output_name(path)
+            if name in names:
+                print(f"Name clash with {names[name]}, skipped: {path}")
+                continue
+            names[name] = str(path)
+            by_size.setdefault(size, []).append(str(path))
+            yield path
+            continue
+        print(f"Duplicate of {canonical}: {path}")
+        if output_dir is not None:
+            record_alias(output_dir, path, canonical)
+
+
+# --shard i/N on the command line, or INVOICE_SHARD="i/N": this machine's part
+# of the input, i from 0 to N-1; None when the run is not sharded
+def get_shard(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    spec = os.environ.get("INVOICE_SHARD", "")
+    for i, arg in enumerate(argv):
+        if arg == "--shard" and i + 1 < len(argv):
+            spec = argv[i + 1]
+        elif arg.startswith("--shard="):
+            spec = arg.split("=", 1)[1]
+    if not spec:
+        return None
+    index, count = (int(part) for part in spec.split("/"))
+    if not 0 <= index < count:
+        raise ValueError(f"Bad shard {spec!r}, expected i/N with 0 <= i < N")
+    return index, count
+
+
+def content_hash(path):
+    if isinstance(path, ArchiveMember):
+        return hashlib.sha256(path.data).hexdigest()
+    return file_hash(path)
+
+
+def shard_files(paths, shard=None):
+    """Yield the paths that belong to shard (index, count), get_shard() by default.
+
+    A file's shard is its content hash modulo count, so every machine
+    listing the same inputs picks a disjoint part without coordination,
+    whatever the folder layout or listing order, and byte-identical copies
+    land on the same shard for skip_duplicates.
+    """
+    if shard is None:
+        shard = get_shard()
+    if shard is None:
+        yield from paths
+        return
+    index, count = shard
+    for path in paths:
+        if int(content_hash(path)[:16], 16) % count == index:
+            yield path
 
 
 # pdf text extracted and save in file and also read text file to get json
 
 
 def extract_and_read_pdf_text(
-    pdf_path, txt_file_path, column_boxes_func, footer_margin=50, no_image_text=True
+    pdf_path,
+    txt_file_path,
+    column_boxes_func,
+    footer_margin=50,
+    no_image_text=True,
+    store=None,
 ):
+    full_text, offset_map = extract_pdf_text(
+        pdf_path, column_boxes_func, footer_margin, no_image_text
+    )
+    return save_pdf_text(txt_file_path, full_text, offset_map, store)
+
 
-    print(f"Processing: {pdf_path}")
-    doc = fitz.open(pdf_path)
+# Column-box text of a PDF and its offset map; no output is written here, so
+# this part can run in a worker process
+def extract_pdf_text(
+    pdf_path, column_boxes_func, footer_margin=50, no_image_text=True, on_page=None
+):
+    # pdf_path may also be PDF bytes or a file object, see pdfsource.open_pdf
+    print(f"Processing: {source_name(pdf_path)}")
     full_text = ""
 
-    for page in doc:
-        bboxes = column_boxes_func(
-            page, footer_margin=footer_margin, no_image_text=no_image_text
+    # offset -> (page, column box) table, one entry per extracted box
+    offset_map = {"offsets": [], "pages": [], "rects": []}
+
+    with open_pdf(pdf_path) as doc:
+        for page in doc:
+            if on_page is not None:
+                on_page(page.number)  # progress for the watchdog
+            bboxes = column_boxes_func(
+                page, footer_margin=footer_margin, no_image_text=no_image_text
+            )
+            for rect in bboxes:
+                try:
+                    text = page.get_text(clip=rect, sort=True)
+                    offset_map["offsets"].append(len(full_text))
+                    offset_map["pages"].append(page.number + 1)
+                    offset_map["rects"].append(list(fitz.Rect(rect).irect))
+                    full_text += text + "\n\n"
+                except Exception as e:
+                    print(f"Text extraction error on page {page.number + 1}: {e}")
+    return full_text, offset_map
+
+
+# same newline handling as reading the text file back
+def normalize_newlines(text):
+    return text.replace("\r\n", "\n").replace("\r", "\n")
+
+
+# Write extracted text and its offset map; returns the text as read back
+def save_pdf_text(txt_file_path, full_text, offset_map, store=None):
+    if store is not None and store.replaces_files:
+        text = normalize_newlines(full_text)
+        vendor, name = get_document_key(txt_file_path)
+        store.add_document(
+            vendor, name, txt_path=txt_file_path, text=text, offset_map=offset_map
         )
-        for rect in bboxes:
-            try:
-                text = page.get_text(clip=rect, sort=True)
-                full_text += text + "\n\n"
-            except Exception as e:
-                print(f"Text extraction error on page {page.number + 1}: {e}")
+        print(f"Text stored for: {vendor}/{name}")
+        return text
 
-    # Write to file
-    with open(txt_file_path, "w", encoding="utf-8") as f:
-        f.write(full_text)
-    print(f"Text saved to: {txt_file_path}")
+    # Write to file (compressed when INVOICE_TEXT_COMPRESSION is set)
+    path, data = encode_text(txt_file_path, full_text)
+    stale = [p for p in text_file_candidates(txt_file_path) if p != path]
+    write_output(path, data, store, remove=stale)
+    write_output(
+        get_offset_map_path(txt_file_path),
+        jsoncodec.dumps(offset_map, compact=True),
+        store,
+    )
+    print(f"Text saved to: {path}")
 
-    # Read back from file
-    with open(txt_file_path, "r", encoding="utf-8") as f:
-        text = f.read()
+    # the text a read-back of the file would give
+    return decode_text(path, data)
 
-    return text
 
+# Output files go through the store's write-behind writer when it has one,
+# otherwise they are written right away; either way via temp file + rename
+def write_output(path, data, store=None, remove=()):
+    writer = store.writer if store is not None else None
+    if writer is not None:
+        writer.submit(path, data, remove)
+        return
+    atomic_write(path, data)
+    for stale in remove:
+        if os.path.isfile(stale):
+            os.remove(stale)
+
+
+# Bytes of an output file, including a write still queued for it
+def read_output(path, store=None):
+    writer = store.writer if store is not None else None
+    if writer is not None:
+        data = writer.get(path)
+        if data is not None:
+            return data
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def output_hash(path, store=None):
+    writer = store.writer if store is not None else None
+    data = writer.get(path) if writer is not None else None
+    if data is not None:
+        return hashlib.sha256(data).hexdigest()
+    return file_hash(path)
+
+
+# find_text_file that also sees text still queued for writing
+def find_text_output(txt_path, store=None):
+    writer = store.writer if store is not None else None
+    if writer is not None:
+        for path in text_file_candidates(txt_path):
+            if writer.get(path) is not None:
+                return path
+    path = find_text_file(txt_path)
+    if path is None:
+        raise FileNotFoundError(txt_path)
+    return path
+
+
+def read_text_output(txt_path, store=None):
+    path = find_text_output(txt_path, store)
+    return decode_text(path, read_output(path, store))
 
-# validation
-def validate_json_vs_text(json_path, txt_path, output_dir):
-    with open(json_path, "r", encoding="utf-8") as jf:
-        data = json.load(jf)
 
-    with open(txt_path, "r", encoding="utf-8") as tf:
-        text = tf.read()
+# offset map saved next to the text file, e.g. Vacotxtfile/inv.map.json
+def get_offset_map_path(txt_path):
+    return os.path.splitext(txt_path)[0] + ".map.json"
 
+
+def load_offset_map(txt_path, store=None):
+    try:
+        return jsoncodec.loads(read_output(get_offset_map_path(txt_path), store))
+    except FileNotFoundError:
+        return None
+
+
+# Resolve a text index to the (page, rect) of the column box containing it
+def lookup_text_region(offset_map, idx):
+    if not offset_map or idx < 0:
+        return None
+    pos = bisect.bisect_right(offset_map["offsets"], idx) - 1
+    if pos < 0:
+        return None
+    return offset_map["pages"][pos], offset_map["rects"][pos]
+
+
+# validation
+def check_values_in_text(data, text, offset_map=None, fuzzy=False, max_distance=2):
     validation_results = []
+    records = []  # (field path, value, index, distance, page) for the store
+    fuzzy_index = None
+
+    # exact search first; in fuzzy mode fall back to a bounded-distance match
+    def find_value(val):
+        nonlocal fuzzy_index
+        idx = text.find(val)
+        if idx != -1 or not fuzzy:
+            return idx, 0
+        if fuzzy_index is None:
+            fuzzy_index = QGramIndex(text)
+        return fuzzy_index.find(val, min(max_distance, len(val) // 4))
+
+    def describe(full_key, val, idx, distance):
+        line = f"{full_key} : '{val}' found at index {idx}"
+        if distance:
+            line += f" (distance {distance})"
+        region = lookup_text_region(offset_map, idx)
+        if region:
+            page_no, rect = region
+            line += f" (page {page_no}, rect {rect})"
+        records.append((full_key, val, idx, distance, region[0] if region else None))
+        return line
 
     def check_value_in_text(key, value, parent_key=""):
         if isinstance(value, dict):
@@ -105,37 +447,230 @@ def validate_json_vs_text(json_path, txt_path, output_dir):
                         )
                 else:
                     val = str(item)
-                    idx = text.find(val)
+                    idx, distance = find_value(val)
                     full_key = (
                         f"{parent_key}.{key}[{i}]" if parent_key else f"{key}[{i}]"
                     )
-                    validation_results.append(
-                        f"{full_key} : '{val}' found at index {idx}"
-                    )
+                    validation_results.append(describe(full_key, val, idx, distance))
         else:
             val = str(value).strip()
             if val:
-                idx = text.find(val)
+                idx, distance = find_value(val)
                 full_key = f"{parent_key}.{key}" if parent_key else key
-                validation_results.append(f"{full_key} : '{val}' found at index {idx}")
+                validation_results.append(describe(full_key, val, idx, distance))
 
     check_value_in_text("", data)
+    return validation_results, records
 
-    # Separate found and not found entries
-    found_entries = [
-        line for line in validation_results if not line.endswith("index -1")
-    ]
+
+def format_validation_report(validation_results):
+    # Separate not found entries
     not_found_entries = [
         line for line in validation_results if line.endswith("index -1")
     ]
 
+    report = "\n".join(validation_results)
+    if not_found_entries:
+        report += "\n\n--- NOT FOUND VALUES ---\n"
+        report += "\n".join(not_found_entries)
+    return report
+
+
+def validate_json_vs_text(
+    json_path, txt_path, output_dir, fuzzy=False, max_distance=2, store=None, data=None
+):
+    if data is None:
+        data = jsoncodec.loads(read_output(json_path, store))
+
+    text = read_text_output(txt_path, store)
+
+    validation_results, records = check_values_in_text(
+        data, text, load_offset_map(txt_path, store), fuzzy, max_distance
+    )
+
     base_name = os.path.splitext(os.path.basename(json_path))[0]
     validation_txt_path = os.path.join(output_dir, f"{base_name}.txt")
 
-    with open(validation_txt_path, "w", encoding="utf-8") as vf:
-        vf.write("\n".join(validation_results))
-        if not_found_entries:
-            vf.write("\n\n--- NOT FOUND VALUES ---\n")
-            vf.write("\n".join(not_found_entries))
+    write_output(
+        validation_txt_path, format_validation_report(validation_results), store
+    )
 
     print(f"Validation file saved: {validation_txt_path}")
+
+    if store is not None:
+        store.add_validation(get_vendor_name(output_dir), base_name, records)
+    return records
+
+
+# "Vacovalidatejsontext" -> "Vaco"
+def get_vendor_name(output_dir):
+    name = os.path.basename(os.path.normpath(output_dir))
+    for suffix in ("validatejsontext", "jsonfile", "txtfile", "textfile"):
+        if name.endswith(suffix) and name != suffix:
+            return name[: -len(suffix)]
+    return name
+
+
+# (vendor, document) key of an output path, e.g. ("Vaco", "vaco_Inv 062 ...")
+def get_document_key(path):
+    vendor = get_vendor_name(os.path.dirname(path))
+    return vendor, os.path.splitext(os.path.basename(path))[0]
+
+
+def save_json_output(output_data, json_file_path, store=None):
+    if store is not None and store.replaces_files:
+        vendor, name = get_document_key(json_file_path)
+        store.add_document(
+            vendor,
+            name,
+            json_path=json_file_path,
+            data=jsoncodec.dumps(output_data).decode("utf-8"),
+        )
+        print(f"JSON stored for: {vendor}/{name}\n")
+        return
+
+    if store is not None and store.json_sink is not None:
+        ndjson_path = store.json_sink.write(json_file_path, output_data)
+        print(f"JSON appended to: {ndjson_path}\n")
+        return
+
+    write_output(json_file_path, jsoncodec.dumps(output_data), store)
+    print(f"JSON saved to: {json_file_path}\n")
+
+
+# incremental validation: hashes of the json/text pair each result was made from
+VALIDATION_MANIFEST = ".validation_hashes"
+_manifest_cache = {}
+
+
+def file_hash(path, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+# Append-only, one JSON object per line; the last entry for a name wins
+def load_validation_manifest(output_dir):
+    if output_dir in _manifest_cache:
+        return _manifest_cache[output_dir]
+    manifest = {}
+    manifest_path = os.path.join(output_dir, VALIDATION_MANIFEST)
+    if os.path.isfile(manifest_path):
+        for entry in read_ndjson(manifest_path):
+            manifest[entry["name"]] = (
+                entry["json"],
+                entry["txt"],
+                entry.get("fuzzy", False),
+            )
+    _manifest_cache[output_dir] = manifest
+    return manifest
+
+
+# Validation records of the pair, or None when it was unchanged and skipped.
+# serialized: the document's JSON when it is in an NDJSON file, not at json_path
+def validate_if_changed(
+    json_path, txt_path, output_dir, fuzzy=False, store=None, serialized=None
+):
+    if store is not None and store.replaces_files:
+        return validate_stored_document(json_path, output_dir, fuzzy, store)
+
+    base_name = os.path.splitext(os.path.basename(json_path))[0]
+    validation_txt_path = os.path.join(output_dir, f"{base_name}.txt")
+
+    # JSON written to the run's NDJSON file instead of json_path
+    if serialized is None and store is not None and store.json_sink is not None:
+        serialized = store.json_sink.get(json_path)
+    if serialized:
+        json_digest = hashlib.sha256(serialized).hexdigest()
+    else:
+        json_digest = output_hash(json_path, store)
+    txt_digest = output_hash(find_text_output(txt_path, store), store)
+    hashes = (json_digest, txt_digest, fuzzy)
+
+    manifest = load_validation_manifest(output_dir)
+    if manifest.get(base_name) == hashes and os.path.isfile(validation_txt_path):
+        print(f"Validation unchanged: {validation_txt_path}")
+        return None
+
+    records = validate_json_vs_text(
+        json_path,
+        txt_path,
+        output_dir,
+        fuzzy=fuzzy,
+        store=store,
+        data=jsoncodec.loads(serialized) if serialized else None,
+    )
+
+    manifest[base_name] = hashes
+    with open(
+        os.path.join(output_dir, VALIDATION_MANIFEST), "a", encoding="utf-8"
+    ) as f:
+        entry = {"name": base_name, "json": hashes[0], "txt": hashes[1]}
+        if fuzzy:
+            entry["fuzzy"] = True
+        f.write(jsoncodec.dumps(entry, compact=True).decode("utf-8") + "\n")
+    return records
+
+
+# (vendor, txt dir, json dir, validation dir) for every "<vendor>jsonfile" dir
+def get_vendor_output_dirs(root="."):
+    output_dirs = []
+    for item in sorted(os.listdir(root)):
+        if not item.endswith("jsonfile") or not os.path.isdir(os.path.join(root, item)):
+            continue
+        vendor = item[: -len("jsonfile")]
+        txt_dir = next(
+            (
+                os.path.join(root, vendor + suffix)
+                for suffix in ("txtfile", "textfile")
+                if os.path.isdir(os.path.join(root, vendor + suffix))
+            ),
+            None,
+        )
+        if txt_dir is None:
+            continue
+        output_dirs.append(
+            (
+                vendor,
+                txt_dir,
+                os.path.join(root, item),
+                os.path.join(root, vendor + "validatejsontext"),
+            )
+        )
+    return output_dirs
+
+
+def text_hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+# validate_if_changed for documents kept in an OutputStore instead of files
+def validate_stored_document(json_path, output_dir, fuzzy, store):
+    vendor, name = get_document_key(json_path)
+    document = store.get_document(vendor, name)
+    hashes = (text_hash(document["data"]), text_hash(document["text"]), fuzzy)
+    stored = (document["json_hash"], document["txt_hash"], bool(document["fuzzy"]))
+    if stored == hashes and document["validation_report"] is not None:
+        print(f"Validation unchanged: {vendor}/{name}")
+        return None
+
+    validation_results, records = check_values_in_text(
+        jsoncodec.loads(document["data"]),
+        document["text"],
+        document["offset_map"],
+        fuzzy,
+    )
+    store.add_validation(vendor, name, records)
+    store.add_document(
+        vendor,
+        name,
+        validation_path=os.path.join(output_dir, f"{name}.txt"),
+        validation_report=format_validation_report(validation_results),
+        json_hash=hashes[0],
+        txt_hash=hashes[1],
+        fuzzy=fuzzy,
+    )
+    print(f"Validation stored for: {vendor}/{name}")
+    return records
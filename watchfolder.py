@@ -0,0 +1,323 @@
+import os
+import sys
+import time
+import errno
+import hashlib
+import select
+import struct
+import ctypes
+import fnmatch
+from pipeline import process_invoices
+from resultstore import open_output_store
+from invoicedaemon import load_vendor_modules
+from pdfsource import ARCHIVE_PATTERNS, ArchiveMember, is_archive, iter_archive
+from utils import archive_member_matches, file_hash, matches_prefix
+from utils import output_name, record_alias, scan_files
+
+# Continuous ingestion: process invoices as they are dropped into a folder,
+# instead of rescanning everything on a schedule.
+#   python watchfolder.py [folder] [--poll] [--initial]    default ./allinvoices
+# --poll skips inotify (network shares do not deliver its events), --initial
+# also processes what is already in the folder. Files are routed to a vendor
+# script by file_prefix against their name or path under the folder, as
+# get_pdf_files does. A file is taken once its size and mtime have not changed
+# for INVOICE_WATCH_SETTLE seconds and, for a PDF, it ends in %%EOF (or has not
+# changed for ten times that long).
+SETTLE_SECONDS = float(os.environ.get("INVOICE_WATCH_SETTLE", 2.0))
+POLL_INTERVAL = float(os.environ.get("INVOICE_WATCH_POLL", 5.0))
+
+WATCH_PATTERNS = ("*.pdf",) + ARCHIVE_PATTERNS
+
+# from <sys/inotify.h>
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_ISDIR = 0x40000000
+EVENT_HEADER = struct.Struct("iIII")  # wd, mask, cookie, name length
+
+
+def is_pdf(path):
+    return path.lower().endswith(".pdf")
+
+
+def is_watched(path):
+    name = os.path.basename(path).lower()
+    return any(fnmatch.fnmatchcase(name, pattern) for pattern in WATCH_PATTERNS)
+
+
+class PollWatcher:
+    """Finds changed files by comparing (size, mtime) snapshots of root."""
+
+    def __init__(self, root):
+        self.root = root
+        self.snapshot = self.scan()
+
+    def scan(self):
+        return {
+            path: (stat.st_size, stat.st_mtime_ns)
+            for path, stat in scan_files(self.root, WATCH_PATTERNS)
+        }
+
+    # Paths created or modified since the last call, after waiting timeout
+    def changes(self, timeout):
+        time.sleep(timeout)
+        snapshot = self.scan()
+        changed = [
+            path for path, sig in snapshot.items() if self.snapshot.get(path) != sig
+        ]
+        self.snapshot = snapshot
+        return changed
+
+    def close(self):
+        pass
+
+
+class InotifyWatcher:
+    """Linux inotify on root and its subfolders, through libc with ctypes.
+
+    Raises OSError where inotify is not available; open_watcher then falls
+    back to PollWatcher.
+    """
+
+    MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+
+    def __init__(self, root):
+        if not sys.platform.startswith("linux"):
+            raise OSError(errno.ENOSYS, f"inotify not available on {sys.platform}")
+        try:
+            self.libc = ctypes.CDLL(None, use_errno=True)
+            init = self.libc.inotify_init1
+        except (OSError, AttributeError, TypeError) as e:
+            raise OSError(errno.ENOSYS, f"inotify not available: {e}")
+        self.fd = init(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.root = root
+        self.dirs = {}  # watch descriptor -> directory
+        self.add_tree(root)
+
+    def add_watch(self, directory):
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(directory), self.MASK)
+        if wd < 0:
+            print(f"Cannot watch {directory}: {os.strerror(ctypes.get_errno())}")
+            return
+        self.dirs[wd] = directory
+
+    # Watch directory and every folder below it; returns the files already there
+    def add_tree(self, directory):
+        self.add_watch(directory)
+        files = []
+        for entry_dir, subdirs, names in os.walk(directory):
+            for subdir in subdirs:
+                self.add_watch(os.path.join(entry_dir, subdir))
+            files.extend(os.path.join(entry_dir, name) for name in names)
+        return files
+
+    def changes(self, timeout):
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return []
+        changed = []
+        while True:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                break
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+                offset += EVENT_HEADER.size
+                name = data[offset : offset + length].rstrip(b"\0")
+                offset += length
+                if mask & IN_Q_OVERFLOW:
+                    # events were dropped; look at everything once
+                    changed.extend(path for path, _ in scan_files(self.root))
+                    continue
+                if wd not in self.dirs or not name:
+                    continue
+                path = os.path.join(self.dirs[wd], os.fsdecode(name))
+                if mask & IN_ISDIR:
+                    # a folder moved or copied in: its files arrive without events
+                    if mask & (IN_CREATE | IN_MOVED_TO):
+                        changed.extend(self.add_tree(path))
+                else:
+                    changed.append(path)
+        return changed
+
+    def close(self):
+        os.close(self.fd)
+
+
+def open_watcher(root, poll=False):
+    if not poll:
+        try:
+            return InotifyWatcher(root)
+        except OSError as e:
+            print(f"{e}; polling every {POLL_INTERVAL}s instead")
+    return PollWatcher(root)
+
+
+# A copy still in progress usually stops before the PDF trailer
+def looks_complete(path):
+    if is_archive(path):
+        return True
+    try:
+        with open(path, "rb") as f:
+            f.seek(max(0, os.fstat(f.fileno()).st_size - 1024))
+            return b"%%EOF" in f.read()
+    except OSError:
+        return False
+
+
+class FolderIngest:
+    """Routes settled files to their vendor script and processes them.
+
+    Content hashes of what was processed are kept for the life of the
+    watch: a file saved again with the same bytes is skipped, and a copy of
+    another invoice is recorded as its alias like skip_duplicates does. A
+    different invoice whose outputs would have the same name as an earlier
+    one's (same file name, other folder) is reported and skipped.
+    """
+
+    def __init__(self, root, store, settle=SETTLE_SECONDS):
+        self.root = root
+        self.store = store
+        self.settle = settle
+        self.modules = load_vendor_modules()
+        # longest prefix first, so "sar" is tried before a shorter "s..."
+        self.prefixes = sorted(
+            ((module.file_prefix.lower(), module) for module in self.modules.values()),
+            key=lambda item: -len(item[0]),
+        )
+        self.pending = {}  # path -> ((size, mtime), first seen with that signature)
+        self.processed = {}  # path -> content hash
+        self.canonical = {}  # content hash -> first path processed with it
+        self.names = {}  # (vendor module, output name) -> path processed with it
+
+    # Vendor script of a PDF by its path under root, e.g. allinvoices/3DE/x.pdf
+    def vendor_module(self, path):
+        for prefix, module in self.prefixes:
+            if isinstance(path, ArchiveMember):
+                archive_rel_path = os.path.relpath(path.archive_path, self.root)
+                if archive_member_matches(archive_rel_path, path.member_name, prefix):
+                    return module
+            elif matches_prefix(os.path.relpath(path, self.root), prefix):
+                return module
+        return None
+
+    def add(self, paths):
+        for path in paths:
+            if is_watched(path) and path not in self.pending:
+                self.pending[path] = (None, 0.0)
+
+    # Paths whose size and mtime held still for settle seconds
+    def settled(self):
+        now = time.monotonic()
+        ready = []
+        for path, (sig, since) in list(self.pending.items()):
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                del self.pending[path]  # moved away or deleted again
+                continue
+            current = (stat.st_size, stat.st_mtime_ns)
+            if current != sig:
+                self.pending[path] = (current, now)
+            elif now - since >= self.settle and (
+                looks_complete(path) or now - since >= 10 * self.settle
+            ):
+                del self.pending[path]
+                ready.append(path)
+        return ready
+
+    # (source, vendor module) per PDF of path that is new or changed
+    def expand(self, path):
+        if is_archive(path):
+            try:
+                sources = [
+                    (member, self.vendor_module(member), member.data)
+                    for member in iter_archive(path, is_pdf)
+                ]
+            except Exception as e:
+                print(f"Cannot read archive {path}: {e}")
+                return []
+        else:
+            sources = [(path, self.vendor_module(path), None)]
+
+        jobs = []
+        for source, module, data in sources:
+            if module is None:
+                print(f"No vendor script for {source}, skipped")
+                continue
+            if data is None:
+                digest = file_hash(source)
+            else:
+                digest = hashlib.sha256(data).hexdigest()
+            key = str(source)
+            if self.processed.get(key) == digest:
+                print(f"Unchanged: {key}")
+                continue
+            canonical = self.canonical.get(digest)
+            if canonical is not None and canonical != key:
+                print(f"Duplicate of {canonical}: {key}")
+                record_alias(module.output_dir_json, key, canonical)
+                continue
+            owner = self.names.setdefault((module, output_name(key)), key)
+            if owner != key:
+                print(f"Name clash with {owner}, skipped: {key}")
+                continue
+            self.processed[key] = digest
+            self.canonical.setdefault(digest, key)
+            jobs.append((source, module))
+        return jobs
+
+    def process(self, paths):
+        by_module = {}
+        for path in paths:
+            for source, module in self.expand(path):
+                by_module.setdefault(module, []).append(source)
+        for module, sources in by_module.items():
+            process_invoices(
+                sources,
+                module.parse_invoice,
+                module.column_boxes,
+                module.output_dir_txt,
+                module.output_dir_json,
+                module.validation_output_dir,
+                store=self.store,
+                resume=True,  # the journal is kept across batches
+            )
+            self.store.flush()
+
+    def run(self, watcher):
+        while True:
+            # wake up often enough to notice files settling
+            timeout = self.settle / 2 if self.pending else POLL_INTERVAL
+            self.add(watcher.changes(timeout))
+            ready = self.settled()
+            if ready:
+                self.process(ready)
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    poll = "--poll" in args
+    initial = "--initial" in args
+    folders = [arg for arg in args if not arg.startswith("--")]
+    root = folders[0] if folders else "./allinvoices"
+
+    results_store = open_output_store()
+    ingest = FolderIngest(root, results_store)
+    watcher = open_watcher(root, poll)
+    if initial:
+        ingest.add(path for path, _ in scan_files(root, WATCH_PATTERNS))
+    print(f"Watching {root} with {type(watcher).__name__}")
+    try:
+        ingest.run(watcher)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        watcher.close()
+        results_store.close()
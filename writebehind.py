@@ -0,0 +1,131 @@
+import os
+import queue
+import tempfile
+import threading
+
+_mode_lock = threading.Lock()
+_new_file_mode = None
+
+
+# Mode open() gives a new file: 0o666 less the umask. Linux shows the umask in
+# /proc; elsewhere it can only be read by setting it, so that is done once
+def new_file_mode():
+    global _new_file_mode
+    with _mode_lock:
+        if _new_file_mode is None:
+            umask = None
+            try:
+                with open("/proc/self/status") as f:
+                    for line in f:
+                        if line.startswith("Umask:"):
+                            umask = int(line.split()[1], 8)
+            except OSError:
+                pass
+            if umask is None:
+                umask = os.umask(0o022)
+                os.umask(umask)
+            _new_file_mode = 0o666 & ~umask
+        return _new_file_mode
+
+
+# Write to a temp file next to path, then rename it into place, so readers
+# see either the old file or the complete new one, never a partial write.
+# The temp name is unique, so threads writing the same path do not collide.
+def atomic_write(path, data, fsync=False):
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    directory, name = os.path.split(path)
+    fd, tmp_path = tempfile.mkstemp(
+        prefix=f".{name}.", suffix=".tmp", dir=directory or "."
+    )
+    try:
+        with open(fd, "wb") as f:
+            f.write(data)
+            if fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        if os.name != "nt":
+            # mkstemp made it owner-only; Windows has no such permission bits
+            os.chmod(tmp_path, new_file_mode())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+class WriteBehindWriter:
+    """Background thread that takes output file writes off the parsing loop.
+
+    submit() queues (path, bytes) and returns at once; a single writer
+    thread drains the queue with atomic_write. The queue holds at most
+    max_pending writes, so a slow disk blocks the producer instead of
+    letting memory grow. Content that is queued but not yet on disk can
+    be read back with get(). close() waits for every queued write.
+    A write that fails with OSError is reported and the others go on; any
+    other exception is raised again by the next flush() or close().
+    """
+
+    def __init__(self, max_pending=64, fsync=False):
+        self.queue = queue.Queue(maxsize=max_pending)
+        self.fsync = fsync
+        self.lock = threading.Lock()
+        self.pending = {}  # path -> newest bytes not yet renamed into place
+        self.errors = []
+        self.failure = None  # first exception other than OSError
+        self.thread = threading.Thread(
+            target=self.run, name="write-behind", daemon=True
+        )
+        self.thread.start()
+
+    def submit(self, path, data, remove=()):
+        """Queue data for path; files in remove are deleted once it lands."""
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        with self.lock:
+            self.pending[path] = data
+        self.queue.put((path, data, tuple(remove)))
+
+    def get(self, path):
+        with self.lock:
+            return self.pending.get(path)
+
+    def run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                self.queue.task_done()
+                return
+            path, data, remove = item
+            try:
+                atomic_write(path, data, self.fsync)
+                for stale in remove:
+                    if os.path.isfile(stale):
+                        os.remove(stale)
+            except Exception as e:
+                self.errors.append((path, e))
+                print(f"Write failed for {path}: {e}")
+                if not isinstance(e, OSError) and self.failure is None:
+                    self.failure = e
+            finally:
+                with self.lock:
+                    # a newer submit for the same path keeps its entry
+                    if self.pending.get(path) is data:
+                        del self.pending[path]
+                self.queue.task_done()
+
+    def raise_failure(self):
+        failure, self.failure = self.failure, None
+        if failure is not None:
+            raise failure
+
+    def flush(self):
+        self.queue.join()
+        self.raise_failure()
+
+    def close(self):
+        self.queue.put(None)
+        self.thread.join()
+        if self.errors:
+            print(f"{len(self.errors)} output file(s) could not be written")
+        self.raise_failure()